@@ -0,0 +1,83 @@
+from fastapi import HTTPException, Query
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from models import Task, FolderMember
+from schemas import RepeatEnum, TaskModel
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from recurrence import expand_occurrences
+import base64, binascii, json, os, uuid
+
+AGENDA_MAX_RANGE_DAYS = int(os.getenv("AGENDA_MAX_RANGE_DAYS", 366))
+
+
+def naive_local(value: datetime) -> datetime:
+    # tasks.due is a naive timestamp in the server's local time; an offset in
+    # the query is converted to that rather than compared with naive values
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+class AgendaParams:
+    def __init__(
+        self,
+        start: datetime = Query(..., alias="from"),
+        end: datetime = Query(..., alias="to"),
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        start, end = naive_local(start), naive_local(end)
+        if end <= start:
+            raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+        if end - start > timedelta(days=AGENDA_MAX_RANGE_DAYS):
+            raise HTTPException(status_code=400, detail=f"The agenda range may span at most {AGENDA_MAX_RANGE_DAYS} days")
+
+        self.start = start
+        self.end = end
+        self.cursor = cursor
+        self.limit = limit
+
+
+def encode_agenda_cursor(occurrence: datetime, task_id: int) -> str:
+    raw = json.dumps({"o": occurrence.isoformat(), "i": task_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_agenda_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return naive_local(datetime.fromisoformat(payload["o"])), int(payload["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def build_agenda(db: AsyncSession, user_id: uuid.UUID, params: AgendaParams) -> Tuple[List[dict], Optional[str]]:
+    start, after = params.start, None
+    if params.cursor:
+        after = decode_agenda_cursor(params.cursor)
+        start = max(start, after[0])
+
+    # one-off tasks due in the range, plus repeating tasks that started before
+    # its end; both halves are served by the due indexes
+    stmt = (
+        select(Task)
+        .join(FolderMember, and_(FolderMember.folder_id == Task.folder_id, FolderMember.user_id == user_id))
+        .where(or_(
+            and_(Task.due >= start, Task.due < params.end),
+            and_(Task.repeat_type != RepeatEnum.never, Task.due < params.end),
+        ))
+    )
+    tasks = (await db.execute(stmt)).scalars().all()
+
+    items, next_cursor = [], None
+    for occurrence, task in expand_occurrences(tasks, start, params.end):
+        if after and (occurrence, task.id) <= after:
+            continue
+        if len(items) == params.limit:
+            last = items[-1]
+            next_cursor = encode_agenda_cursor(last["occurrence"], last["id"])
+            break
+        items.append({**TaskModel.model_validate(task, from_attributes=True).model_dump(), "occurrence": occurrence})
+
+    return items, next_cursor
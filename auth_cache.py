@@ -0,0 +1,98 @@
+from fastapi_users import exceptions
+from fastapi_users.authentication import JWTStrategy
+from fastapi_users.jwt import decode_jwt
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from models import User
+from metrics import registry
+import jwt, os, time, uuid
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", 300))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 10000))
+# user updates only invalidate the worker that made them, so this bounds
+# how long other workers keep accepting a deactivated user
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 30))
+
+cache_hits = registry.counter("auth_cache_hits_total", "Authentication cache hits", ["cache"])
+cache_misses = registry.counter("auth_cache_misses_total", "Authentication cache misses", ["cache"])
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            cache_misses.inc(cache=self.name)
+            return None
+
+        self._entries.move_to_end(key)
+        cache_hits.inc(cache=self.name)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# token -> user id, for tokens whose signature and claims were checked
+token_cache = TTLCache("token", AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL)
+# user id -> column values of the users row
+user_cache = TTLCache("user", AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL)
+
+user_columns = [column.key for column in User.__table__.columns]
+
+
+def invalidate_user(user_id: uuid.UUID):
+    user_cache.invalidate(user_id)
+
+
+class CachedJWTStrategy(JWTStrategy):
+    async def read_token(self, token: Optional[str], user_manager) -> Optional[User]:
+        if token is None:
+            return None
+
+        user_id = token_cache.get(token)
+        if user_id is None:
+            try:
+                data = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+                user_id = user_manager.parse_id(data["sub"])
+            except (jwt.PyJWTError, KeyError, exceptions.InvalidID):
+                return None
+
+            # never past the token's own expiry
+            lifetime = data["exp"] - time.time() if "exp" in data else self.lifetime_seconds or AUTH_TOKEN_CACHE_TTL
+            token_cache.set(token, user_id, lifetime)
+
+        values: Optional[Dict[str, Any]] = user_cache.get(user_id)
+        if values is None:
+            try:
+                user = await user_manager.get(user_id)
+            except exceptions.UserNotExists:
+                token_cache.invalidate(token)
+                return None
+
+            values = {key: getattr(user, key) for key in user_columns}
+            user_cache.set(user_id, values)
+
+        # a fresh transient object per request, so no request can change
+        # another's user or drag it into its session
+        return User(**values)
@@ -0,0 +1,211 @@
+"""Benchmark the API endpoints and compare against an earlier run.
+
+    python -m benchmarks.run --mode inprocess --output results.json
+    python -m benchmarks.run --mode http --base-url http://localhost:8080 --baseline results.json
+
+Logs in as seeded users (see benchmarks.seed) and runs every scenario for
+--requests requests at --concurrency. Reports p50/p95/p99 latency,
+throughput and SQL statements per request, the last taken from the app's
+own /metrics before and after each scenario.
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import argparse, asyncio, json, os, random, re, statistics, sys, time
+import httpx
+
+from benchmarks.seed import BENCH_PASSWORD, user_email
+
+metric_line = re.compile(r'^(db_queries_per_request_(?:sum|count))\{route="([^"]*)"\} (\S+)$', re.M)
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    route: str
+    # builds (path, json body) for one request from the session's user
+    build: Callable[["Session", random.Random], tuple]
+
+
+@dataclass
+class Session:
+    headers: Dict[str, str]
+    folder_ids: List[int]
+
+
+scenarios = [
+    Scenario("list tasks", "GET", "/tasks", lambda s, r: ("/tasks?limit=100", None)),
+    Scenario("list all tasks", "GET", "/tasks", lambda s, r: ("/tasks", None)),
+    Scenario("list folders", "GET", "/folders", lambda s, r: ("/folders", None)),
+    Scenario("get folder", "GET", "/folders/{folder_id}", lambda s, r: (f"/folders/{r.choice(s.folder_ids)}", None)),
+    Scenario("folder tasks", "GET", "/folders/{folder_id}/tasks", lambda s, r: (f"/folders/{r.choice(s.folder_ids)}/tasks?limit=100", None)),
+    Scenario("filter tasks", "POST", "/tasks/search", lambda s, r: ("/tasks/search", {"title": "report", "priority": "high"})),
+    Scenario("full-text search", "POST", "/tasks/search", lambda s, r: ("/tasks/search?q=deploy%20rel&limit=50", {})),
+    Scenario("agenda", "GET", "/tasks/agenda", lambda s, r: ("/tasks/agenda?from=2026-01-01T00:00:00&to=2026-01-31T00:00:00&limit=200", None)),
+    Scenario("sync snapshot", "GET", "/sync", lambda s, r: ("/sync", None)),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def scrape_queries(client: httpx.AsyncClient, metrics_token: Optional[str]) -> Dict[str, Dict[str, float]]:
+    headers = {"Authorization": f"Bearer {metrics_token}"} if metrics_token else {}
+    response = await client.get("/metrics", headers=headers)
+    stats: Dict[str, Dict[str, float]] = {}
+    for name, route, value in metric_line.findall(response.text):
+        stats.setdefault(route, {})[name.rsplit("_", 1)[1]] = float(value)
+    return stats
+
+async def login(client: httpx.AsyncClient, index: int) -> Session:
+    response = await client.post("/auth/jwt/login", data={"username": user_email(index), "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    folders = (await client.get("/folders", headers=headers)).json()
+    return Session(headers, [folder["id"] for folder in folders])
+
+async def run_scenario(client, scenario: Scenario, sessions: List[Session], args) -> dict:
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    errors = 0
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            session = rng.choice(sessions)
+            path, body = scenario.build(session, rng)
+            start = time.perf_counter()
+            response = await client.request(scenario.method, path, json=body, headers=session.headers)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    before = await scrape_queries(client, args.metrics_token)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await scrape_queries(client, args.metrics_token)
+
+    route_before, route_after = before.get(scenario.route, {}), after.get(scenario.route, {})
+    counted = route_after.get("count", 0) - route_before.get("count", 0)
+    queries = (route_after.get("sum", 0) - route_before.get("sum", 0)) / counted if counted else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "queries_per_request": queries,
+    }
+
+def make_client(args) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=args.concurrency + 2)
+    if args.mode == "http":
+        return httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits)
+
+    # the load would otherwise mostly measure 429s; main is already
+    # imported through benchmarks.seed, so the setting is changed in place
+    import ratelimit
+    ratelimit.RATE_LIMIT_PER_SECOND = 0
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60, limits=limits)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {previous[key]:.1f} -> {current[key]:.1f}")
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f}")
+        if previous.get("queries_per_request") is not None and current.get("queries_per_request") is not None:
+            if current["queries_per_request"] > previous["queries_per_request"] + 0.01:
+                regressions.append(f"{name}: queries/request {previous['queries_per_request']:.2f} -> {current['queries_per_request']:.2f}")
+    return regressions
+
+def change(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return ""
+    return f" ({(current - previous) / previous * 100:+.0f}%)"
+
+def report(results: dict, baseline: dict):
+    print(f"{'scenario':<18} {'reqs':>6} {'err':>4} {'req/s':>14} {'p50 ms':>14} {'p95 ms':>14} {'p99 ms':>14} {'q/req':>6}")
+    for name, r in results.items():
+        b = baseline.get(name, {})
+        queries = f"{r['queries_per_request']:.1f}" if r["queries_per_request"] is not None else "-"
+        print(
+            f"{name:<18} {r['requests']:>6} {r['errors']:>4} "
+            f"{r['throughput']:>7.1f}{change(r['throughput'], b.get('throughput')):>7} "
+            f"{r['p50_ms']:>7.1f}{change(r['p50_ms'], b.get('p50_ms')):>7} "
+            f"{r['p95_ms']:>7.1f}{change(r['p95_ms'], b.get('p95_ms')):>7} "
+            f"{r['p99_ms']:>7.1f}{change(r['p99_ms'], b.get('p99_ms')):>7} "
+            f"{queries:>6}"
+        )
+
+
+async def run(args) -> dict:
+    async with make_client(args) as client:
+        sessions = [await login(client, index) for index in range(args.sessions)]
+
+        results = {}
+        for scenario in scenarios:
+            if args.only and not any(part in scenario.name for part in args.only):
+                continue
+            for _ in range(args.warmup):
+                session = sessions[0]
+                path, body = scenario.build(session, random.Random(args.seed))
+                await client.request(scenario.method, path, json=body, headers=session.headers)
+            results[scenario.name] = await run_scenario(client, scenario, sessions, args)
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--metrics-token", default=os.getenv("METRICS_TOKEN"))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=20, help="seeded users to log in as")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--only", nargs="*", help="run scenarios whose name contains any of these")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mode": args.mode, "requests": args.requests, "concurrency": args.concurrency, "results": results}, f, indent=2)
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\nregressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
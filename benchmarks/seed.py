@@ -0,0 +1,111 @@
+"""Seed synthetic users, folders, memberships and tasks for the benchmarks.
+
+    python -m benchmarks.seed --users 1000 --tasks 100000
+
+Connects through the same DATABASE_URL / DB_* variables as the app and runs
+the migrations first. Every user gets the password in BENCH_PASSWORD.
+"""
+from sqlalchemy import insert, text
+from datetime import datetime, timedelta
+from dependencies import engine
+from main import run_migrations
+from models import User, Folder, FolderMember, Task
+from schemas import RoleEnum, CompletedEnum, PriorityEnum, RepeatEnum
+from security import password_hash
+import argparse, asyncio, random, time, uuid
+
+BENCH_PASSWORD = "benchmark-password"
+BATCH_SIZE = 5000
+
+words = (
+    "report invoice meeting groceries review deploy refactor call dentist budget "
+    "draft slides homework laundry backup email roadmap contract gym taxes "
+    "design release migrate interview plan order renew schedule clean fix"
+).split()
+
+
+def user_email(index: int) -> str:
+    return f"bench{index}@example.com"
+
+def sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(length))
+
+async def insert_batches(conn, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        await conn.execute(insert(table), rows[start:start + BATCH_SIZE])
+
+async def seed(args):
+    rng = random.Random(args.seed)
+    now = datetime.now()
+
+    async with engine.connect() as conn:
+        await conn.run_sync(run_migrations)
+
+    async with engine.begin() as conn:
+        if args.reset:
+            await conn.execute(text("TRUNCATE tasks, folder_members, folders, tombstones, users RESTART IDENTITY CASCADE"))
+
+        # one hash shared by every user keeps seeding fast
+        hashed = password_hash.hash(BENCH_PASSWORD)
+        users = [
+            {"id": uuid.uuid4(), "email": user_email(i), "hashed_password": hashed, "is_active": True, "is_superuser": False, "is_verified": True}
+            for i in range(args.users)
+        ]
+        await insert_batches(conn, User, users)
+
+        folders = []
+        for user in users:
+            for _ in range(args.folders_per_user):
+                folders.append({"name": sentence(rng, 2), "owner_id": user["id"], "created_at": now, "updated_at": now, "version": 1})
+        result = await conn.execute(insert(Folder).returning(Folder.id, Folder.owner_id, sort_by_parameter_order=True), folders)
+        folder_rows = result.all()
+
+        members = []
+        for folder_id, owner_id in folder_rows:
+            members.append({"folder_id": folder_id, "user_id": owner_id, "role": RoleEnum.owner, "added_at": now, "updated_at": now})
+            shared = rng.sample(users, min(args.members_per_folder, len(users)))
+            for user in shared:
+                if user["id"] != owner_id:
+                    role = rng.choice([RoleEnum.editor, RoleEnum.viewer])
+                    members.append({"folder_id": folder_id, "user_id": user["id"], "role": role, "added_at": now, "updated_at": now})
+        await insert_batches(conn, FolderMember, members)
+
+        tasks = []
+        for _ in range(args.tasks):
+            folder_id, owner_id = rng.choice(folder_rows)
+            repeating = rng.random() < args.repeating
+            tasks.append({
+                "title": sentence(rng, rng.randint(2, 5)),
+                "description": sentence(rng, rng.randint(0, 20)) or None,
+                "completed": rng.choice(list(CompletedEnum)),
+                "due": now + timedelta(days=rng.randint(-180, 180), minutes=rng.randint(0, 1439)) if repeating or rng.random() < 0.8 else None,
+                "priority": rng.choice([None, *PriorityEnum]),
+                "repeat_type": rng.choice([RepeatEnum.daily, RepeatEnum.weekly, RepeatEnum.monthly]) if repeating else RepeatEnum.never,
+                "repeat_amount": rng.randint(1, 3) if repeating else 1,
+                "created": now - timedelta(days=rng.randint(0, 365)),
+                "updated_at": now,
+                "user_id": owner_id,
+                "folder_id": folder_id,
+            })
+        await insert_batches(conn, Task, tasks)
+        await conn.execute(text("ANALYZE"))
+
+    return len(users), len(folder_rows), len(members), len(tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--folders-per-user", type=int, default=2)
+    parser.add_argument("--members-per-folder", type=int, default=3, help="shared members per folder besides the owner")
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--repeating", type=float, default=0.1, help="fraction of repeating tasks")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="truncate existing data first")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = asyncio.run(seed(args))
+    print("seeded %d users, %d folders, %d memberships, %d tasks in %.1fs" % (*counts, time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main()
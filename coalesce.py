@@ -0,0 +1,55 @@
+from fastapi import Response
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+from metrics import registry
+import asyncio, os
+
+# identical reads in flight on this worker share one query and one rendered body
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+
+coalesced_requests = registry.counter("coalesced_requests_total", "Requests answered from an identical request already in flight", ["route"])
+
+
+class Flight:
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.response: Optional[Response] = None
+        self.error: Optional[Exception] = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+
+    async def run(self, route: str, key: Hashable, render: Callable[[], Awaitable[Response]]) -> Response:
+        while (flight := self._flights.get(key)) is not None:
+            await flight.done.wait()
+            # a cancelled leader leaves nothing to share; the next waiter leads
+            if flight.abandoned:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            coalesced_requests.inc(route=route)
+            return copy_response(flight.response)
+
+        flight = self._flights[key] = Flight()
+        try:
+            flight.response = await render()
+        except asyncio.CancelledError:
+            flight.abandoned = True
+            raise
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            del self._flights[key]
+            flight.done.set()
+        return copy_response(flight.response)
+
+
+def copy_response(response: Response) -> Response:
+    # each request gets its own Response around the shared body, since the
+    # middleware may add per-request headers to it in place
+    return Response(content=response.body, status_code=response.status_code, headers=dict(response.headers))
+
+single_flight = SingleFlight()
@@ -0,0 +1,72 @@
+from fastapi import Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from models import Folder, FolderMember
+import hashlib, uuid
+
+
+async def bump_folder_versions(db: AsyncSession, folder_ids: Iterable[int]):
+    # runs in the caller's transaction, so the new version becomes visible
+    # together with the change it describes
+    folder_ids = sorted(set(folder_ids))
+    if not folder_ids:
+        return
+
+    stmt = (
+        update(Folder)
+        .where(Folder.id.in_(folder_ids))
+        .values(version=Folder.version + 1, updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
+
+async def folder_versions(db: AsyncSession, user_id: uuid.UUID, folder_id: Optional[int] = None) -> List[Tuple[int, int]]:
+    stmt = (
+        select(Folder.id, Folder.version)
+        .join(FolderMember, FolderMember.folder_id == Folder.id)
+        .where(FolderMember.user_id == user_id)
+        .order_by(Folder.id)
+    )
+    if folder_id is not None:
+        stmt = stmt.where(Folder.id == folder_id)
+
+    result = await db.execute(stmt)
+    return [tuple(row) for row in result]
+
+def collection_etag(request: Request, user_id: uuid.UUID, versions: List[Tuple[int, int]]) -> str:
+    # the query string covers sort, cursor, limit and format, and the user
+    # covers which folders and roles the listing was built from
+    digest = hashlib.sha256()
+    digest.update(f"{user_id}|{request.url.path}?{request.url.query}|".encode())
+    digest.update(",".join(f"{id}:{version}" for id, version in versions).encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    candidates = [value.strip() for value in header.split(",")]
+    # If-None-Match uses the weak comparison
+    return "*" in candidates or etag in (value.removeprefix("W/") for value in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    folder_id: Optional[int] = None
+) -> Optional[Response]:
+    versions = await folder_versions(db, user_id, folder_id)
+    etag = collection_etag(request, user_id, versions)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response.headers["ETag"] = etag
+    return None
@@ -0,0 +1,190 @@
+from sqlalchemy import text
+from typing import AsyncIterator, Dict, Optional, Set
+from dependencies import engine, DATABASE_URL
+from schemas import TaskModel
+import asyncio, json, os, uuid
+
+# memory: events only reach subscribers connected to the same worker
+# postgres: fanned out to every worker through LISTEN/NOTIFY
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "folder_events")
+# events buffered per subscriber before it counts as a slow consumer
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", 15))
+
+# NOTIFY payloads are limited to 8000 bytes
+NOTIFY_MAX_PAYLOAD = 7900
+
+
+class Subscriber:
+    def __init__(self, folder_id: int, user_id: uuid.UUID):
+        self.folder_id = folder_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE + 1)
+        self.close_reason: Optional[str] = None
+
+    def offer(self, event: dict) -> bool:
+        if self.close_reason or self.queue.qsize() >= EVENTS_QUEUE_SIZE:
+            return False
+        self.queue.put_nowait(event)
+        return True
+
+    def close(self, reason: str, drop_backlog: bool = False):
+        if self.close_reason:
+            return
+        self.close_reason = reason
+        while drop_backlog and not self.queue.empty():
+            self.queue.get_nowait()
+        # offer() keeps one slot free for the close marker
+        self.queue.put_nowait(None)
+
+
+class EventHub:
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self.backend = MemoryBackend(self)
+
+    async def start(self):
+        if EVENTS_BACKEND == "postgres":
+            self.backend = PostgresBackend(self)
+        await self.backend.start()
+
+    async def stop(self):
+        await self.backend.stop()
+        self.close_all("shutdown")
+
+    def close_all(self, reason: str):
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                subscriber.close(reason)
+        self._subscribers.clear()
+
+    def subscribe(self, folder_id: int, user_id: uuid.UUID) -> Subscriber:
+        subscriber = Subscriber(folder_id, user_id)
+        self._subscribers.setdefault(folder_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.folder_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.folder_id]
+
+    async def publish(self, folder_id: int, type: str, actor_id: Optional[uuid.UUID], **data):
+        # called after the change is committed; changes made by the server
+        # itself have no actor
+        event = {"type": type, "folder_id": folder_id, "actor_id": str(actor_id) if actor_id else None, **data}
+        await self.backend.publish(event)
+
+    def deliver(self, event: dict):
+        folder_id = event["folder_id"]
+        for subscriber in list(self._subscribers.get(folder_id, ())):
+            if not subscriber.offer(event):
+                # its backlog is dropped, the client resyncs after reconnecting
+                subscriber.close("slow consumer", drop_backlog=True)
+                self.unsubscribe(subscriber)
+
+        # access is gone, so the affected streams end after this event
+        if event["type"] == "folder.deleted":
+            revoked = list(self._subscribers.get(folder_id, ()))
+        elif event["type"] == "member.removed":
+            revoked = [s for s in self._subscribers.get(folder_id, ()) if str(s.user_id) == event["user_id"]]
+        else:
+            revoked = []
+
+        for subscriber in revoked:
+            subscriber.close(event["type"])
+            self.unsubscribe(subscriber)
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[str]:
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is None:
+                    yield f"event: close\ndata: {json.dumps({'reason': subscriber.close_reason})}\n\n"
+                    return
+
+                yield f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+class MemoryBackend:
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: dict):
+        self.hub.deliver(event)
+
+
+class PostgresBackend:
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self.dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self._connection = None
+        self._reconnect: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        import asyncpg
+
+        self._connection = await asyncpg.connect(self.dsn)
+        self._connection.add_termination_listener(self._on_terminate)
+        await self._connection.add_listener(EVENTS_CHANNEL, self._on_notify)
+
+    async def stop(self):
+        self._stopping = True
+        if self._reconnect:
+            self._reconnect.cancel()
+        if self._connection and not self._connection.is_closed():
+            await self._connection.close()
+
+    async def publish(self, event: dict):
+        payload = json.dumps(event, separators=(",", ":"))
+        if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+            # subscribers refetch the task when only its id arrives
+            event = {**event, "task": {"id": event["task"]["id"]}} if "task" in event else event
+            payload = json.dumps({**event, "truncated": True}, separators=(",", ":"))
+
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": EVENTS_CHANNEL, "payload": payload})
+            await conn.commit()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.hub.deliver(json.loads(payload))
+
+    def _on_terminate(self, connection):
+        # events sent while disconnected are lost, so clients reconnect and resync
+        self.hub.close_all("reconnect")
+        if not self._stopping:
+            self._reconnect = asyncio.get_running_loop().create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        delay = 1
+        while not self._stopping:
+            try:
+                await self.start()
+                return
+            except Exception:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+def task_payload(task) -> dict:
+    return TaskModel.model_validate(task, from_attributes=True).model_dump(mode="json")
+
+
+event_hub = EventHub()
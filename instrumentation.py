@@ -0,0 +1,94 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from typing import Optional
+from metrics import registry
+from logs import get_logger, log_event
+import logging, os, time
+
+# seconds; statements slower than this are logged, 0 turns the log off
+DB_SLOW_QUERY_SECONDS = float(os.getenv("DB_SLOW_QUERY_SECONDS", 0))
+# identical statements per request before the request is flagged as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+request_duration = registry.histogram("http_request_duration_seconds", "Request latency by route", ["method", "route"])
+requests_total = registry.counter("http_requests_total", "Requests by route and status code", ["method", "route", "status"])
+request_queries = registry.histogram("db_queries_per_request", "SQL statements executed per request", ["route"], buckets=QUERY_COUNT_BUCKETS)
+request_query_seconds = registry.histogram("db_query_seconds_per_request", "Time spent in SQL statements per request", ["route"])
+n_plus_one_total = registry.counter("db_n_plus_one_total", "Requests that repeated one statement at least N_PLUS_ONE_THRESHOLD times", ["route"])
+slow_queries_total = registry.counter("db_slow_queries_total", "Statements slower than DB_SLOW_QUERY_SECONDS")
+
+logger = get_logger("db")
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = StatementCounter()
+
+query_stats_var: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+
+    stats = query_stats_var.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.statements[statement] += 1
+
+    if DB_SLOW_QUERY_SECONDS and elapsed >= DB_SLOW_QUERY_SECONDS:
+        slow_queries_total.inc()
+        log_event(logger, "db.slow_query", logging.WARNING, seconds=round(elapsed, 4), statement=statement[:1000])
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = query_stats_var.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            query_stats_var.reset(token)
+            # the route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+
+            request_duration.observe(time.perf_counter() - start, method=method, route=route)
+            requests_total.inc(method=method, route=route, status=str(status))
+            request_queries.observe(stats.count, route=route)
+            request_query_seconds.observe(stats.seconds, route=route)
+
+            if stats.statements:
+                statement, repeats = stats.statements.most_common(1)[0]
+                if repeats >= N_PLUS_ONE_THRESHOLD:
+                    n_plus_one_total.inc(route=route)
+                    log_event(logger, "db.n_plus_one", logging.WARNING, route=route, repeats=repeats, statement=statement[:1000])
@@ -0,0 +1,233 @@
+from sqlalchemy import select, update, delete, event, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from dependencies import async_session_maker
+from models import Job
+from schemas import JobStatusEnum
+from metrics import registry
+from logs import get_logger, log_event
+import asyncio, os, uuid
+
+# memory: jobs run on the worker that queued them and are lost on restart
+# postgres: jobs are rows in the jobs table, claimed by any worker
+JOBS_BACKEND = os.getenv("JOBS_BACKEND", "memory")
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", 2))
+# seconds between polls of the jobs table while it has nothing to claim
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 1))
+# a running job without a heartbeat for this long is claimed again
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", 60))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", 24))
+
+jobs_finished = registry.counter("jobs_finished_total", "Background jobs by kind and final status", ["kind", "status"])
+
+logger = get_logger("jobs")
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs: Dict[uuid.UUID, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def start(self):
+        pass
+
+    async def create(self, kind: str, payload: dict, user_id: Optional[uuid.UUID], db: Optional[AsyncSession] = None) -> Job:
+        self.prune()
+        job = Job(id=uuid.uuid4(), kind=kind, status=JobStatusEnum.pending, payload=payload, user_id=user_id, attempts=0, created_at=datetime.now())
+
+        def submit(*args):
+            self._jobs[job.id] = job
+            self._queue.put_nowait(job.id)
+
+        # with the caller's session the job is only queued once that commits
+        if db is None:
+            submit()
+        else:
+            event.listen(db.sync_session, "after_commit", submit, once=True)
+        return job
+
+    async def claim(self) -> Optional[Job]:
+        job = self._jobs[await self._queue.get()]
+        job.status = JobStatusEnum.running
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = datetime.now()
+        return job
+
+    async def heartbeat(self, job: Job):
+        job.heartbeat_at = datetime.now()
+
+    async def release(self, job: Job, error: str):
+        job.status = JobStatusEnum.pending
+        job.error = error
+        self._queue.put_nowait(job.id)
+
+    async def finish(self, job: Job, status: JobStatusEnum, result: Optional[dict] = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = datetime.now()
+
+    async def get(self, job_id: uuid.UUID) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def unfinished_payloads(self, kind: str) -> List[dict]:
+        return [job.payload for job in self._jobs.values() if job.kind == kind and job.status in (JobStatusEnum.pending, JobStatusEnum.running)]
+
+    def prune(self):
+        cutoff = datetime.now() - timedelta(hours=JOBS_RETENTION_HOURS)
+        for job_id in [job.id for job in self._jobs.values() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+class PostgresJobStore:
+    async def start(self):
+        cutoff = datetime.now() - timedelta(hours=JOBS_RETENTION_HOURS)
+        async with async_session_maker() as session:
+            await session.execute(delete(Job).where(Job.finished_at < cutoff))
+            await session.commit()
+
+    async def create(self, kind: str, payload: dict, user_id: Optional[uuid.UUID], db: Optional[AsyncSession] = None) -> Job:
+        job = Job(id=uuid.uuid4(), kind=kind, status=JobStatusEnum.pending, payload=payload, user_id=user_id, attempts=0, created_at=datetime.now())
+        # with the caller's session the row commits (or rolls back) with its change
+        if db is not None:
+            db.add(job)
+            return job
+
+        async with async_session_maker() as session:
+            session.add(job)
+            await session.commit()
+        return job
+
+    async def unfinished_payloads(self, kind: str) -> List[dict]:
+        stmt = select(Job.payload).where(Job.kind == kind, Job.status.in_([JobStatusEnum.pending, JobStatusEnum.running]))
+        async with async_session_maker() as session:
+            return list((await session.execute(stmt)).scalars())
+
+    async def claim(self) -> Optional[Job]:
+        # SKIP LOCKED lets every worker poll without two of them taking the
+        # same job; the claim is committed at once and the heartbeat keeps it
+        now = datetime.now()
+        claimable = (
+            select(Job.id)
+            .where(or_(
+                Job.status == JobStatusEnum.pending,
+                and_(Job.status == JobStatusEnum.running, Job.heartbeat_at < now - timedelta(seconds=JOBS_LEASE_SECONDS)),
+            ))
+            .order_by(Job.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(Job)
+            .where(Job.id == claimable)
+            .values(status=JobStatusEnum.running, attempts=Job.attempts + 1, started_at=now, heartbeat_at=now)
+            .returning(Job)
+        )
+        async with async_session_maker() as session:
+            job = (await session.execute(stmt)).scalar_one_or_none()
+            await session.commit()
+        return job
+
+    async def heartbeat(self, job: Job):
+        await self._update(job, heartbeat_at=datetime.now())
+
+    async def release(self, job: Job, error: str):
+        await self._update(job, status=JobStatusEnum.pending, error=error)
+
+    async def finish(self, job: Job, status: JobStatusEnum, result: Optional[dict] = None, error: Optional[str] = None):
+        await self._update(job, status=status, result=result, error=error, finished_at=datetime.now())
+
+    async def get(self, job_id: uuid.UUID) -> Optional[Job]:
+        async with async_session_maker() as session:
+            return await session.get(Job, job_id)
+
+    async def _update(self, job: Job, **values):
+        async with async_session_maker() as session:
+            await session.execute(update(Job).where(Job.id == job.id).values(**values))
+            await session.commit()
+
+
+Handler = Callable[..., Awaitable[Optional[dict]]]
+
+class JobRunner:
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+        self.store = MemoryJobStore()
+        self._workers: List[asyncio.Task] = []
+
+    def handler(self, kind: str):
+        def register(func: Handler) -> Handler:
+            self.handlers[kind] = func
+            return func
+        return register
+
+    async def start(self):
+        if JOBS_BACKEND == "postgres":
+            self.store = PostgresJobStore()
+        await self.store.start()
+
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._work()) for _ in range(JOBS_CONCURRENCY)]
+
+    async def stop(self):
+        # interrupted postgres jobs are picked up again once their lease runs out
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(self, kind: str, user_id: Optional[uuid.UUID] = None, db: Optional[AsyncSession] = None, **payload) -> Job:
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for job kind {kind!r}")
+        job = await self.store.create(kind, payload, user_id, db)
+        log_event(logger, "job.queued", job_id=str(job.id), kind=kind)
+        return job
+
+    async def get(self, job_id: uuid.UUID) -> Optional[Job]:
+        return await self.store.get(job_id)
+
+    async def unfinished_payloads(self, kind: str) -> List[dict]:
+        return await self.store.unfinished_payloads(kind)
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.store.claim()
+                if job is None:
+                    await asyncio.sleep(JOBS_POLL_INTERVAL)
+                    continue
+                await self.run(job)
+            except Exception:
+                logger.exception("Job worker failed", extra={"event": "job.worker_failed"})
+                await asyncio.sleep(JOBS_POLL_INTERVAL)
+
+    async def run(self, job: Job):
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job))
+        try:
+            result = await self.handlers[job.kind](**job.payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts < JOBS_MAX_ATTEMPTS:
+                logger.warning("Job failed, retrying", exc_info=True, extra={"event": "job.retry", "job_id": str(job.id), "kind": job.kind})
+                await self.store.release(job, error)
+            else:
+                logger.exception("Job failed", extra={"event": "job.failed", "job_id": str(job.id), "kind": job.kind})
+                await self.store.finish(job, JobStatusEnum.failed, error=error)
+                jobs_finished.inc(kind=job.kind, status=JobStatusEnum.failed.value)
+        else:
+            await self.store.finish(job, JobStatusEnum.succeeded, result=result)
+            jobs_finished.inc(kind=job.kind, status=JobStatusEnum.succeeded.value)
+            log_event(logger, "job.succeeded", job_id=str(job.id), kind=job.kind)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(JOBS_LEASE_SECONDS / 3)
+            await self.store.heartbeat(job)
+
+
+job_runner = JobRunner()
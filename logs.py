@@ -0,0 +1,123 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit, json, logging, os, queue, random, re, sys, uuid
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# e.g. "auth.attempt=0.1,auth.unknown_user=0.5"; unlisted events are all kept
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+request_id_pattern = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+reserved_attributes = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in reserved_attributes})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    # a full queue drops the record instead of blocking the event loop
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging() -> QueueListener:
+    # records are filtered and formatted on the calling side, where the
+    # request id is visible, and written to stdout by a listener thread
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    handler.setFormatter(formatter)
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(handler.queue, stream)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.handlers = [handler]
+    logger.propagate = False
+    return listener
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"app.{name}")
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"event": event, **fields})
+
+
+class RequestIdMiddleware:
+    def __init__(self, app, header: str = "X-Request-ID"):
+        self.app = app
+        self.header = header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # a well-formed id from an upstream proxy is kept so logs line up
+        incoming = dict(scope["headers"]).get(self.header, b"").decode("latin-1")
+        request_id = incoming if request_id_pattern.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+listener = setup_logging()
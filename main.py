@@ -1,28 +1,110 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Dict, List
-from models import Task, User, Folder, FolderMember, Base
-from dependencies import get_db, get_user_manager, auth_backend, engine
-from schemas import TaskModel, TaskResponse, FolderModel, FolderMemberModel, FolderMemberWithEmail, UserRead, UserCreate, UserUpdate, UserReturnModel, RoleEnum, Optional
+from models import Task, User, Folder, FolderMember
+from dependencies import get_db, get_read_db, fastapi_users, current_active_user, auth_backend, engine, async_session_maker, warm_pools, dispose_engines, migration_lock
+from schemas import TaskModel, TaskResponse, TaskSearchResult, AgendaItem, TaskBatchOperation, TaskBatchResult, TaskBatchResponse, BatchOperationEnum, SyncResponse, JobModel, FolderModel, FolderListItem, FolderSummary, FolderMemberModel, FolderMemberWithEmail, UserRead, UserCreate, UserUpdate, UserReturnModel, RoleEnum, CompletedEnum, RepeatEnum, ListFormatEnum, ExportFormatEnum, ImportResult, ImportRowError, Optional
+from permissions import FolderAccess, folder_access_cache, shares_access_cache, resolve_folder_access, resolve_folder_access_many, require_access, invalidate_folder_access, editor_roles
+from search import TaskSearchParams, apply_text_search, search_results, render_search_results
+from metrics import registry
+from logs import RequestIdMiddleware, get_logger, log_event
+from instrumentation import MetricsMiddleware
+from etags import bump_folder_versions, collection_etag, conditional_get, folder_versions
+from events import event_hub, task_payload
+from recurrence import next_occurrence, recurrence_scheduler
+from agenda import AgendaParams, build_agenda
+from summary import build_folder_summaries
+from jobs import job_runner
+from ratelimit import rate_limit, rate_limiter
+from coalesce import REQUEST_COALESCING, single_flight
+from transfer import IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS, export_media_types, read_import, storage_error, store_tasks, stream_csv
+from security import limit_login_concurrency, shutdown_password_hashing
+from sync import build_sync, decode_sync_token, record_task_deletions, record_folder_deletion, record_member_removal, prune_tombstones
+from pagination import TaskListParams, TaskListResponse, apply_keyset, split_page, stream_ndjson, task_columns, task_dicts
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Query
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from sqlalchemy.orm import Query, aliased
+from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_users import FastAPIUsers
-from sqlalchemy import select
-import os, uuid
+from sqlalchemy import select, insert, update, delete, exists, inspect, func, and_
+from alembic import command
+from alembic.config import Config
+from contextlib import asynccontextmanager
+import os, secrets, time, uuid
 
-app = FastAPI()
+BASELINE_REVISION = "0001"
+# set when migrations run separately (serve.py runs them once before
+# starting the workers)
+SKIP_SCHEMA_INIT = os.getenv("SKIP_SCHEMA_INIT", "false").lower() == "true"
+
+startup_seconds = registry.gauge("app_startup_seconds", "Time spent in each startup phase of this worker", ["phase"])
+logger = get_logger("lifecycle")
+
+def run_migrations(connection):
+    config = Config(os.path.join(os.path.dirname(__file__), "alembic.ini"))
+    config.attributes["connection"] = connection
+
+    with migration_lock(connection):
+        tables = inspect(connection).get_table_names()
+        # let alembic manage its own transactions (index builds run outside one)
+        connection.commit()
+
+        # databases created by Base.metadata.create_all before migrations existed
+        if "tasks" in tables and "alembic_version" not in tables:
+            command.stamp(config, BASELINE_REVISION)
+
+        command.upgrade(config, "head")
 
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    async with engine.connect() as conn:
+        await conn.run_sync(run_migrations)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    phase_started = started
+
+    def phase_done(phase: str):
+        nonlocal phase_started
+        now = time.perf_counter()
+        startup_seconds.set(now - phase_started, phase=phase)
+        phase_started = now
+
+    if not SKIP_SCHEMA_INIT:
+        await init_db()
+        phase_done("migrations")
+
+    # connections are opened now rather than by the first requests
+    await warm_pools()
+    phase_done("pool_warmup")
+
+    async with async_session_maker() as session:
+        await prune_tombstones(session)
+
+    await rate_limiter.start()
+    await event_hub.start()
+    recurrence_scheduler.start()
+    await job_runner.start()
+    await requeue_folder_purges()
+    phase_done("background")
 
-@app.on_event("startup")
-async def on_startup():
-    await init_db()
+    startup_seconds.set(time.perf_counter() - started, phase="total")
+    log_event(logger, "app.started", seconds=round(time.perf_counter() - started, 3), pid=os.getpid())
+
+    yield
+
+    # the server has stopped accepting requests and drained the in-flight ones
+    await job_runner.stop()
+    await recurrence_scheduler.stop()
+    await event_hub.stop()
+    shutdown_password_hashing()
+    await dispose_engines()
+    log_event(logger, "app.stopped", pid=os.getpid())
+
+app = FastAPI(lifespan=lifespan)
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,17 +112,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID"],
 )
 
-fastapi_users = FastAPIUsers[User, uuid.UUID](
-    get_user_manager,
-    [auth_backend]
-)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
     prefix="/auth/jwt",
     tags=["auth"],
+    dependencies=[Depends(limit_login_concurrency)],
 )
 
 app.include_router(
@@ -52,55 +134,209 @@ app.include_router(
 uneditable_fields = {"id", "created", "user_id", "folder_id"}
 unnullable = {"title", "completed", "repeat_type", "repeat_amount"}
 
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", 1000))
+# tasks removed per transaction when a deleted folder is purged
+FOLDER_DELETE_CHUNK_SIZE = int(os.getenv("FOLDER_DELETE_CHUNK_SIZE", 5000))
+
 
 # helper functions
 
-def add_interval(due: datetime, repeat: str, amount: int):
-    if repeat == "daily":
-        return due + timedelta(days=amount)
-    elif repeat == "weekly":
-        return due + timedelta(weeks=amount)
-    elif repeat == "monthly":
-        return due + relativedelta(months=amount)
-    elif repeat == "yearly":
-        return due + relativedelta(years=amount)
-    
 async def check_folder_access(
     folder_id: int,
     mode: str,
     db: AsyncSession,
     current_user: User
 ):
-    stmt = select(Folder).filter(Folder.id == folder_id).distinct()
-    result = await db.execute(stmt)
-    folder = result.scalar_one_or_none()
+    access = await resolve_folder_access(folder_id, db, current_user.id)
+    return require_access(access, mode, current_user.id)
+
+def editable_by(user_id: uuid.UUID):
+    return exists().where(
+        FolderMember.folder_id == Task.folder_id,
+        FolderMember.user_id == user_id,
+        FolderMember.role.in_(editor_roles)
+    )
 
-    if not folder:
-        raise HTTPException(status_code=404, detail="Folder not found")
+async def check_task_write_access(id: int, db: AsyncSession, current_user: User):
+    result = await db.execute(select(Task.folder_id).filter(Task.id == id))
+    folder_id = result.scalar_one_or_none()
 
-    if mode == "owner":
-        if folder.owner_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Only the folder owner can perform this action")
-    elif mode == "editor":
-        stmt = select(FolderMember).filter(
-            FolderMember.folder_id == folder_id,
-            FolderMember.user_id == current_user.id,
-            FolderMember.role.in_([RoleEnum.owner, RoleEnum.editor])
-        ).distinct()
-        result = await db.execute(stmt)
-        folder_member = result.scalar_one_or_none()
-        if not folder_member:
-            raise HTTPException(status_code=403, detail="You must be an editor or owner to perform this action")
-    elif mode == "member":
-        stmt = select(FolderMember).filter(FolderMember.folder_id == folder_id, FolderMember.user_id == current_user.id).distinct()
-        result = await db.execute(stmt)
-        folder_member = result.scalar_one_or_none()
-        if not folder_member:
-            raise HTTPException(status_code=403, detail="User is not a member of this folder")
-    else:
-        raise HTTPException(status_code=400, detail="Invalid mode. Mode must be either 'owner', 'editor', or 'member'")
+    if folder_id is None:
+        raise HTTPException(status_code=404, detail="Task not found")
 
-    return folder
+    await check_folder_access(folder_id, mode="editor", db=db, current_user=current_user)
+
+async def raise_task_write_error(id: int, db: AsyncSession, current_user: User):
+    # only reached when a single-statement write matched no row, to report
+    # the same 404/403 the task lookup and access check would have
+    await check_task_write_access(id, db, current_user)
+    raise HTTPException(status_code=403, detail="You must be an editor or owner to perform this action")
+
+def prepare_task_update(new_task: TaskModel) -> dict:
+    if new_task.repeat_type and new_task.repeat_type != "never" and new_task.due is None:
+        raise HTTPException(status_code=400, detail="Cannot repeat task when due date is not specified")
+
+    if new_task.repeat_type and new_task.repeat_type != "never" and new_task.repeat_amount is not None and new_task.repeat_amount < 1:
+        raise HTTPException(status_code=400, detail="repeat_amount must be at least 1")
+
+    values = {}
+    for field, value in new_task.__dict__.items():
+        if field not in uneditable_fields:
+            if field in unnullable and value is None:
+                raise HTTPException(status_code=400, detail=f"{field} cannot be null")
+            values[field] = value
+
+    if values["completed"] == "true" and values["repeat_type"] != "never":
+        values["due"] = next_occurrence(values["due"], values["repeat_type"], values["repeat_amount"])
+        values["completed"] = CompletedEnum.false
+
+    return values
+
+def prepare_task_create(task: TaskModel, folder_id: int, user_id: uuid.UUID) -> dict:
+    if task.title is None:
+        raise HTTPException(status_code=400, detail="title cannot be null")
+
+    if task.repeat_type and task.repeat_type != "never" and task.due is None:
+        raise HTTPException(status_code=400, detail="Cannot repeat task when due date is not specified")
+
+    if task.repeat_type and task.repeat_type != "never" and task.repeat_amount is not None and task.repeat_amount < 1:
+        raise HTTPException(status_code=400, detail="repeat_amount must be at least 1")
+
+    return {
+        "title": task.title,
+        "description": task.description,
+        "completed": task.completed or CompletedEnum.false,
+        "due": task.due,
+        "priority": task.priority,
+        "repeat_type": task.repeat_type or RepeatEnum.never,
+        "repeat_amount": task.repeat_amount or 1,
+        "user_id": user_id,
+        "folder_id": folder_id,
+        "created": datetime.now()
+    }
+
+def prepare_task_completion(task: dict) -> dict:
+    if task["repeat_type"] == "never":
+        return {"completed": CompletedEnum.true}
+
+    if task["due"] is None:
+        raise HTTPException(status_code=400, detail="Cannot repeat task when due date is not specified")
+
+    # stored rows predate the repeat_amount check on every write path
+    if task["repeat_amount"] is None or task["repeat_amount"] < 1:
+        raise HTTPException(status_code=400, detail="repeat_amount must be at least 1")
+
+    return {
+        "completed": CompletedEnum.false,
+        "due": next_occurrence(task["due"], task["repeat_type"], task["repeat_amount"])
+    }
+
+async def run_task_batch(
+    operations: List[TaskBatchOperation],
+    db: AsyncSession,
+    current_user: User,
+    folder_id: Optional[int] = None
+):
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_OPERATIONS} operations")
+
+    results: List[Optional[TaskBatchResult]] = [None] * len(operations)
+
+    task_ids = {op.id for op in operations if op.op != BatchOperationEnum.create and op.id is not None}
+    existing = {}
+    if task_ids:
+        result = await db.execute(select(*task_columns).where(Task.id.in_(task_ids)))
+        existing = {row.id: row._asdict() for row in result}
+
+    # one access lookup for every folder the batch touches
+    folder_ids = {folder_id} if folder_id is not None else set()
+    for op in operations:
+        if op.op == BatchOperationEnum.create:
+            if folder_id is None and op.task and op.task.folder_id is not None:
+                folder_ids.add(op.task.folder_id)
+        elif op.id in existing:
+            folder_ids.add(existing[op.id]["folder_id"])
+    accesses = await resolve_folder_access_many(folder_ids, db, current_user.id)
+
+    creates, updates, deletes = [], [], []
+    targeted = set()
+
+    for index, op in enumerate(operations):
+        try:
+            if op.op == BatchOperationEnum.create:
+                if op.task is None:
+                    raise HTTPException(status_code=400, detail="task is required")
+                target = folder_id if folder_id is not None else op.task.folder_id
+                if target is None:
+                    raise HTTPException(status_code=400, detail="folder_id is required")
+                require_access(accesses.get(target), "member", current_user.id)
+                creates.append((index, prepare_task_create(op.task, target, current_user.id)))
+                continue
+
+            if op.id is None:
+                raise HTTPException(status_code=400, detail="id is required")
+            task = existing.get(op.id)
+            if task is None or (folder_id is not None and task["folder_id"] != folder_id):
+                raise HTTPException(status_code=404, detail="Task not found")
+            if op.id in targeted:
+                raise HTTPException(status_code=409, detail="Task is already targeted by another operation in this batch")
+            require_access(accesses.get(task["folder_id"]), "editor", current_user.id)
+
+            if op.op == BatchOperationEnum.update:
+                if op.task is None:
+                    raise HTTPException(status_code=400, detail="task is required")
+                updates.append((index, {**task, **prepare_task_update(op.task)}))
+            elif op.op == BatchOperationEnum.complete:
+                updates.append((index, {**task, **prepare_task_completion(task)}))
+            else:
+                deletes.append((index, task))
+            targeted.add(op.id)
+        except HTTPException as e:
+            results[index] = TaskBatchResult(index=index, op=op.op, status_code=e.status_code, detail=e.detail)
+
+    if creates:
+        stmt = insert(Task).returning(*task_columns, sort_by_parameter_order=True)
+        result = await db.execute(stmt, [values for _, values in creates])
+        for (index, _), row in zip(creates, result):
+            results[index] = TaskBatchResult(index=index, op=BatchOperationEnum.create, status_code=201, task=row._asdict())
+
+    if updates:
+        editable = set(TaskModel.model_fields) - uneditable_fields
+        params = [{"id": task["id"], **{field: task[field] for field in editable}} for _, task in updates]
+        await db.execute(update(Task), params)
+
+    if deletes:
+        stmt = delete(Task).where(Task.id.in_([task["id"] for _, task in deletes])).execution_options(synchronize_session=False)
+        await db.execute(stmt)
+        await record_task_deletions(db, [(task["id"], task["folder_id"]) for _, task in deletes])
+
+    changed_folders = {values["folder_id"] for _, values in creates + updates + deletes}
+    await bump_folder_versions(db, changed_folders)
+
+    await db.commit()
+
+    for index, task in updates + deletes:
+        results[index] = TaskBatchResult(index=index, op=operations[index].op, status_code=200, task=task)
+
+    for result in results:
+        if result.status_code < 300:
+            await publish_task_event(task_event_types[result.op], result.task, current_user.id)
+
+    return {"message": "Batch processed", "results": results}
+
+task_event_types = {
+    BatchOperationEnum.create: "task.created",
+    BatchOperationEnum.update: "task.updated",
+    BatchOperationEnum.complete: "task.updated",
+    BatchOperationEnum.delete: "task.deleted",
+}
+
+async def publish_task_event(type: str, task, actor_id: uuid.UUID):
+    payload = task_payload(task)
+    folder_id = payload["folder_id"]
+    if type == "task.deleted":
+        payload = {"id": payload["id"]}
+    await event_hub.publish(folder_id, type, actor_id, task=payload)
 
 def apply_task_filters(query: Query, task: TaskModel):
     if task.title:
@@ -124,6 +360,125 @@ def apply_task_filters(query: Query, task: TaskModel):
     
     return query
 
+async def run_task_search(stmt, search: TaskSearchParams, db: AsyncSession):
+    # without a full-text query the title/description ILIKE filters apply as before
+    if not search.query:
+        if search.limit:
+            stmt = stmt.limit(search.limit)
+        result = await db.execute(stmt)
+        return result.scalars().all()
+
+    result = await db.execute(apply_text_search(stmt, search))
+    return search_results(result)
+
+async def coalesced_task_search(request: Request, stmt, task: TaskModel, search: TaskSearchParams, db: AsyncSession, user_id: uuid.UUID, folder_id: Optional[int] = None):
+    if not REQUEST_COALESCING:
+        return await run_task_search(stmt, search, db)
+
+    # folder versions move with every write, so a request never joins a
+    # search that started before a change it should see
+    versions = await folder_versions(db, user_id, folder_id)
+    key = (collection_etag(request, user_id, versions), task.model_dump_json(exclude_unset=True))
+
+    async def render():
+        return render_search_results(await run_task_search(stmt, search, db))
+
+    return await single_flight.run(request.scope["route"].path, key, render)
+
+async def list_tasks(stmt, params: TaskListParams, db: AsyncSession, response: Response):
+    stmt = apply_keyset(stmt, params.sort, params.cursor)
+
+    if params.format == ListFormatEnum.ndjson:
+        if params.limit:
+            stmt = stmt.limit(params.limit)
+        return StreamingResponse(stream_ndjson(stmt, db.bind), media_type="application/x-ndjson", headers=dict(response.headers))
+
+    if params.limit:
+        stmt = stmt.limit(params.limit + 1)
+
+    result = await db.execute(stmt)
+    rows, next_cursor = split_page(result.all(), params.sort, params.limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # plain column rows rendered by orjson; skips the ORM identity map and
+    # per-object response_model validation
+    return TaskListResponse(task_dicts(rows), headers=dict(response.headers))
+
+
+# sync
+
+@app.get("/sync", response_model=SyncResponse)
+async def sync(
+    since: Optional[str] = None,
+    # deltas are read from the primary: a lagging replica could hide rows
+    # written just before the new token, and they would never be sent
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(current_active_user)
+):
+    since_at = decode_sync_token(since) if since else None
+    return await build_sync(db, current_user.id, since_at)
+
+
+# jobs
+
+@job_runner.handler("folder.delete")
+async def purge_folder(folder_id: int) -> dict:
+    # chunked set-based deletes keep each transaction and its locks short;
+    # the folder row goes last and the database cascades anything left over.
+    # Only marked folders are purged, so a repeated job is harmless.
+    async with async_session_maker() as session:
+        marked = await session.scalar(select(Folder.id).where(Folder.id == folder_id, Folder.deleted_at.is_not(None)))
+    if marked is None:
+        return {"folder_id": folder_id, "tasks_deleted": 0}
+
+    tasks_deleted = 0
+    while True:
+        chunk = select(Task.id).where(Task.folder_id == folder_id).limit(FOLDER_DELETE_CHUNK_SIZE).scalar_subquery()
+        async with async_session_maker() as session:
+            result = await session.execute(delete(Task).where(Task.id.in_(chunk)).execution_options(synchronize_session=False))
+            await session.commit()
+        tasks_deleted += result.rowcount
+        if result.rowcount < FOLDER_DELETE_CHUNK_SIZE:
+            break
+
+    async with async_session_maker() as session:
+        await session.execute(delete(Folder).where(Folder.id == folder_id).execution_options(synchronize_session=False))
+        await session.commit()
+
+    return {"folder_id": folder_id, "tasks_deleted": tasks_deleted}
+
+async def requeue_folder_purges():
+    # memory jobs die with the worker; a marked folder without an unfinished
+    # purge job is queued again so its tasks are not left behind
+    async with async_session_maker() as session:
+        folder_ids = set((await session.execute(select(Folder.id).where(Folder.deleted_at.is_not(None)))).scalars())
+    queued = {payload["folder_id"] for payload in await job_runner.unfinished_payloads("folder.delete")}
+
+    for folder_id in sorted(folder_ids - queued):
+        await job_runner.enqueue("folder.delete", folder_id=folder_id)
+
+@app.get("/jobs/{job_id}", response_model=JobModel)
+async def get_job(
+    job_id: uuid.UUID,
+    current_user: User = Depends(current_active_user)
+):
+    job = await job_runner.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+# metrics
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))):
+    if METRICS_TOKEN and (credentials is None or not secrets.compare_digest(credentials.credentials, METRICS_TOKEN)):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 
 # user
 
@@ -167,25 +522,47 @@ async def get_user_by_email(
 
 # tasks
 
-@app.get("/tasks", response_model=List[TaskModel])
+@app.get("/tasks", response_model=List[TaskModel], dependencies=[Depends(rate_limit)])
 async def get_tasks(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    request: Request,
+    response: Response,
+    params: TaskListParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
+    not_modified = await conditional_get(request, response, db, current_user.id)
+    if not_modified:
+        return not_modified
+
     stmt = (
-        select(Task)
+        select(*task_columns)
         .join(Task.folder)
         .join(Folder.members)
         .where(FolderMember.user_id == current_user.id)
     )
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    if REQUEST_COALESCING and params.format == ListFormatEnum.json:
+        # the ETag covers the user, the query string and the folder versions
+        return await single_flight.run(request.scope["route"].path, response.headers["ETag"], lambda: list_tasks(stmt, params, db, response))
+    return await list_tasks(stmt, params, db, response)
+
+@app.get("/tasks/agenda", response_model=List[AgendaItem])
+async def get_agenda(
+    response: Response,
+    params: AgendaParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
+):
+    items, next_cursor = await build_agenda(db, current_user.id, params)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return items
 
 @app.get("/tasks/{id}", response_model=TaskModel)
 async def get_task_by_id(
     id: int, 
-    db: AsyncSession = Depends(get_db), 
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    db: AsyncSession = Depends(get_read_db), 
+    current_user: User = Depends(current_active_user)
 ):
     stmt = select(Task).filter(Task.id == id)
     result = await db.execute(stmt)
@@ -203,58 +580,72 @@ async def update_task(
     id: int, 
     new_task: TaskModel, 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
-    stmt = select(Task).filter(Task.id == id)
+    try:
+        values = prepare_task_update(new_task)
+    except HTTPException:
+        # a missing task or folder access takes precedence over a bad payload
+        await check_task_write_access(id, db, current_user)
+        raise
+
+    stmt = (
+        update(Task)
+        .where(Task.id == id, editable_by(current_user.id))
+        .values(**values)
+        .returning(Task)
+        .execution_options(synchronize_session=False)
+    )
     result = await db.execute(stmt)
     db_task = result.scalar_one_or_none()
 
     if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    await check_folder_access(db_task.folder_id, mode="editor", db=db, current_user=current_user)
-
-    if getattr(new_task, "repeat_type") and getattr(new_task, "repeat_type") != "never" and getattr(new_task, "due") is None:
-        raise HTTPException(status_code=400, detail="Cannot repeat task when due date is not specified")
-
-    for field, value in new_task.__dict__.items():
-        if field not in uneditable_fields:
-            if field in unnullable and value is None:
-                raise HTTPException(status_code=400, detail=f"{field} cannot be null")
-            setattr(db_task, field, value)
-
-    if getattr(db_task, "completed") == "true" and getattr(db_task, "repeat_type") != "never":
-        db_task.due = add_interval(getattr(db_task, "due"), getattr(db_task, "repeat_type"), getattr(db_task, "repeat_amount"))
-        db_task.completed = "false"
+        await raise_task_write_error(id, db, current_user)
 
+    await bump_folder_versions(db, [db_task.folder_id])
     await db.commit()
-    await db.refresh(db_task)
+    await publish_task_event("task.updated", db_task, current_user.id)
     return {"message": "Task Updated", "task": db_task}
 
 @app.delete("/tasks/{id}", response_model=Dict[str, str])
 async def delete_task(
     id: int, 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
-    stmt = select(Task).filter(Task.id == id)
+    stmt = (
+        delete(Task)
+        .where(Task.id == id, editable_by(current_user.id))
+        .returning(Task.folder_id)
+        .execution_options(synchronize_session=False)
+    )
     result = await db.execute(stmt)
-    db_task = result.scalar_one_or_none()
+    folder_id = result.scalar_one_or_none()
 
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    await check_folder_access(db_task.folder_id, mode="editor", db=db, current_user=current_user)
+    if folder_id is None:
+        await raise_task_write_error(id, db, current_user)
 
-    await db.delete(db_task)
+    await record_task_deletions(db, [(id, folder_id)])
+    await bump_folder_versions(db, [folder_id])
     await db.commit()
+    await event_hub.publish(folder_id, "task.deleted", current_user.id, task={"id": id})
     return {"message": "Task Deleted"}
 
-@app.post("/tasks/search", response_model=List[TaskModel])
+@app.post("/tasks:batch", response_model=TaskBatchResponse)
+async def batch_tasks(
+    operations: List[TaskBatchOperation],
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(current_active_user)
+):
+    return await run_task_batch(operations, db, current_user)
+
+@app.post("/tasks/search", response_model=List[TaskSearchResult], response_model_exclude_unset=True, dependencies=[Depends(rate_limit)])
 async def search_tasks(
+    request: Request,
     task: TaskModel, 
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    search: TaskSearchParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
     stmt = (
         select(Task)
@@ -265,32 +656,60 @@ async def search_tasks(
 
     stmt = apply_task_filters(stmt, task)
 
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    return await coalesced_task_search(request, stmt, task, search, db, current_user.id)
 
 
 # folders
 
-@app.get("/folders", response_model=List[FolderModel])
+@app.get("/folders", response_model=List[FolderListItem])
 async def get_all_folders(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
+    not_modified = await conditional_get(request, response, db, current_user.id)
+    if not_modified:
+        return not_modified
+
+    # the caller has one membership row per folder, so joining it needs no
+    # DISTINCT; counts are correlated subqueries on the folder_id indexes
+    members = aliased(FolderMember)
+    member_count = select(func.count()).where(members.folder_id == Folder.id).scalar_subquery()
+    task_count = select(func.count()).where(Task.folder_id == Folder.id).scalar_subquery()
     stmt = (
-        select(Folder)
-        .outerjoin(Folder.members)
-        .where(FolderMember.user_id == current_user.id)
-        .distinct()
+        select(
+            Folder.id, Folder.name, Folder.owner_id, Folder.created_at, FolderMember.role,
+            member_count.label("member_count"), task_count.label("task_count"),
+        )
+        .join(FolderMember, and_(FolderMember.folder_id == Folder.id, FolderMember.user_id == current_user.id))
+        .order_by(Folder.id)
     )
     result = await db.execute(stmt)
-    folders = result.scalars().all()
+    folders = result.mappings().all()
+
+    # later access checks in this worker can skip their own lookup
+    if shares_access_cache(db):
+        for folder in folders:
+            folder_access_cache.set(current_user.id, FolderAccess(
+                id=folder["id"], name=folder["name"], owner_id=folder["owner_id"], created_at=folder["created_at"], role=folder["role"]
+            ))
+
     return folders
 
+# registered before /folders/{folder_id} so "summary" is not parsed as an id
+@app.get("/folders/summary", response_model=List[FolderSummary])
+async def get_folder_summaries(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
+):
+    return await build_folder_summaries(db, current_user.id, datetime.now())
+
 @app.post("/folders", response_model=FolderModel)
 async def create_folder(
     folder: FolderModel,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
     new_folder = Folder(name=folder.name, owner_id=current_user.id)
     db.add(new_folder)
@@ -310,108 +729,219 @@ async def create_folder(
 @app.get("/folders/{folder_id}", response_model=FolderModel)
 async def get_folder_by_id(
     folder_id: int,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
     folder = await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
 
     return folder
 
+@app.get("/folders/{folder_id}/events", response_class=StreamingResponse)
+async def folder_events(
+    folder_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
+):
+    await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
+
+    # the session is released before streaming starts, so open streams hold
+    # no database connection
+    subscriber = event_hub.subscribe(folder_id, current_user.id)
+    return StreamingResponse(
+        event_hub.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.put("/folders/{folder_id}", response_model=FolderModel)
 async def edit_folder(
     folder_id: int,
     new_folder: FolderModel,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
-    folder = await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
-    
-    folder.name = new_folder.name
+    await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
+
+    stmt = update(Folder).where(Folder.id == folder_id).values(name=new_folder.name, version=Folder.version + 1).returning(Folder)
+    result = await db.execute(stmt)
+    folder = result.scalar_one()
 
     await db.commit()
-    await db.refresh(folder)
+    invalidate_folder_access(db, folder_id)
+    await event_hub.publish(folder_id, "folder.updated", current_user.id, name=folder.name)
     return folder
 
 @app.delete("/folders/{folder_id}", response_model=Dict[str, str])
 async def delete_folder(
     folder_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
-    folder = await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
+    await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
 
-    await db.delete(folder)
+    # marking the folder and removing the memberships takes it away from
+    # everyone at once; its tasks and the folder row are purged in the
+    # background by a job queued in the same transaction
+    await record_folder_deletion(db, folder_id)
+    await db.execute(update(Folder).where(Folder.id == folder_id).values(deleted_at=datetime.now()).execution_options(synchronize_session=False))
+    await db.execute(delete(FolderMember).where(FolderMember.folder_id == folder_id))
+    await bump_folder_versions(db, [folder_id])
+    job = await job_runner.enqueue("folder.delete", current_user.id, db=db, folder_id=folder_id)
     await db.commit()
-    return {"message": f"Folder {folder_id} deleted"}
+    invalidate_folder_access(db, folder_id)
+    await event_hub.publish(folder_id, "folder.deleted", current_user.id)
+
+    return {"message": f"Folder {folder_id} deleted", "job_id": str(job.id)}
 
 @app.post("/folders/{folder_id}/tasks", response_model=TaskResponse)
 async def create_task_in_folder(
     folder_id: int,
     task: TaskModel,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
 
-    new_task = Task(
-        title=task.title,
-        description=task.description,
-        completed=task.completed,
-        due=task.due,
-        priority=task.priority,
-        repeat_type=task.repeat_type,
-        repeat_amount=task.repeat_amount,
-        user_id=current_user.id,
-        folder_id=folder_id,
-        created=datetime.now()
-    )
+    new_task = Task(**prepare_task_create(task, folder_id, current_user.id))
     db.add(new_task)
+    await bump_folder_versions(db, [folder_id])
     await db.commit()
     await db.refresh(new_task)
+    await publish_task_event("task.created", new_task, current_user.id)
     return {"message": "Task created successfully", "task": new_task}
 
+@app.post("/folders/{folder_id}/tasks:batch", response_model=TaskBatchResponse)
+async def batch_tasks_in_folder(
+    folder_id: int,
+    operations: List[TaskBatchOperation],
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(current_active_user)
+):
+    await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
+
+    return await run_task_batch(operations, db, current_user, folder_id=folder_id)
+
 @app.get("/folders/{folder_id}/tasks", response_model=List[TaskModel])
 async def get_tasks_by_folder(
     folder_id: int,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    request: Request,
+    response: Response,
+    params: TaskListParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
 
-    stmt = select(Task).filter(Task.folder_id == folder_id)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    not_modified = await conditional_get(request, response, db, current_user.id, folder_id)
+    if not_modified:
+        return not_modified
 
-@app.get("/folders/{folder_id}/members", response_model=List[FolderMemberWithEmail])
-async def get_folder_members(
+    stmt = select(*task_columns).filter(Task.folder_id == folder_id)
+    return await list_tasks(stmt, params, db, response)
+
+@app.get("/folders/{folder_id}/export", response_class=StreamingResponse)
+async def export_folder_tasks(
     folder_id: int,
+    format: ExportFormatEnum = ExportFormatEnum.csv,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
+):
+    await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
+
+    # streamed from a server-side cursor, so memory use does not grow with the folder
+    stmt = select(*task_columns).where(Task.folder_id == folder_id).order_by(Task.id)
+    body = stream_csv(stmt, db.bind) if format == ExportFormatEnum.csv else stream_ndjson(stmt, db.bind)
+    filename = f"folder-{folder_id}-tasks.{format.value}"
+    return StreamingResponse(body, media_type=export_media_types[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/folders/{folder_id}/import", response_model=ImportResult)
+async def import_folder_tasks(
+    folder_id: int,
+    request: Request,
+    format: ExportFormatEnum = ExportFormatEnum.csv,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
 
+    # FOR KEY SHARE keeps a concurrent purge from deleting the folder
+    # mid-import, and opens the transaction the COPY batches run in
+    result = await db.execute(select(Folder.id).where(Folder.id == folder_id).with_for_update(key_share=True))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    imported, failed = 0, 0
+    errors: List[ImportRowError] = []
+    batch = []
+    now = datetime.now()
+
+    async for number, task in read_import(request, format):
+        if isinstance(task, TaskModel):
+            try:
+                values = prepare_task_create(task, folder_id, current_user.id)
+            except HTTPException as e:
+                task = e.detail
+            else:
+                # an exported created date survives the round trip
+                values = {**values, "created": task.created or values["created"], "updated_at": now}
+                task = storage_error(values)
+                if task is None:
+                    batch.append((number, values))
+                    if len(batch) == IMPORT_BATCH_SIZE:
+                        await store_tasks(db, batch)
+                        imported += len(batch)
+                        batch = []
+                    continue
+
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append(ImportRowError(row=number, detail=task))
+
+    if batch:
+        await store_tasks(db, batch)
+        imported += len(batch)
+
+    if imported:
+        await bump_folder_versions(db, [folder_id])
+    await db.commit()
+
+    if imported:
+        await event_hub.publish(folder_id, "tasks.imported", current_user.id, count=imported)
+    return ImportResult(imported=imported, failed=failed, errors=errors)
+
+@app.get("/folders/{folder_id}/members", response_model=List[FolderMemberWithEmail])
+async def get_folder_members(
+    folder_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
+):
+    # members are only returned when the caller is one of them, so access
+    # and data come back in one query; an empty result falls back to the
+    # regular check to tell a missing folder from a forbidden one
+    caller = aliased(FolderMember)
     stmt = (
-        select(FolderMember, User.email)
+        select(FolderMember.id, FolderMember.folder_id, FolderMember.user_id, FolderMember.role, FolderMember.added_at, User.email)
         .join(User, FolderMember.user_id == User.id)
-        .where(FolderMember.folder_id == folder_id)
+        .where(
+            FolderMember.folder_id == folder_id,
+            exists().where(caller.folder_id == folder_id, caller.user_id == current_user.id),
+        )
+        .order_by(FolderMember.id)
     )
     result = await db.execute(stmt)
-    members = result.all()
-    return [FolderMemberWithEmail(
-        id=member.FolderMember.id,
-        folder_id=member.FolderMember.folder_id,
-        user_id=member.FolderMember.user_id,
-        role=member.FolderMember.role,
-        added_at=member.FolderMember.added_at,
-        email=member.email
-    ) for member in members]
+    members = result.mappings().all()
+
+    if not members:
+        await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
+
+    return members
 
 @app.post("/folders/{folder_id}/members", response_model=FolderMemberModel)
 async def add_folder_member(
     folder_id: int,
     folder_member: FolderMemberModel,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
 
@@ -430,16 +960,19 @@ async def add_folder_member(
 
     new_member = FolderMember(folder_id=folder_id, user_id=folder_member.user_id, role=folder_member.role)
     db.add(new_member)
+    await bump_folder_versions(db, [folder_id])
     await db.commit()
     await db.refresh(new_member)
+    invalidate_folder_access(db, folder_id, folder_member.user_id)
+    await event_hub.publish(folder_id, "member.added", current_user.id, user_id=str(new_member.user_id), role=new_member.role)
     return new_member
 
 @app.get("/folders/{folder_id}/members/{member_id}", response_model=FolderMemberModel)
 async def get_folder_member_by_id(
     folder_id: int,
     member_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
 
@@ -461,7 +994,7 @@ async def change_member_permissions(
     member_id: uuid.UUID,
     folder_member: FolderMemberModel,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
 
@@ -479,8 +1012,11 @@ async def change_member_permissions(
         raise HTTPException(status_code=400, detail="Cannot change a member's role to 'owner'.")
 
     member.role = folder_member.role
+    await bump_folder_versions(db, [folder_id])
     await db.commit()
     await db.refresh(member)
+    invalidate_folder_access(db, folder_id, member_id)
+    await event_hub.publish(folder_id, "member.updated", current_user.id, user_id=str(member_id), role=member.role)
     return member
 
 @app.delete("/folders/{folder_id}/members/{member_id}", response_model=Dict[str, str])
@@ -488,7 +1024,7 @@ async def delete_folder_member(
     folder_id: int,
     member_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="owner", db=db, current_user=current_user)
 
@@ -502,21 +1038,26 @@ async def delete_folder_member(
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
 
+    await record_member_removal(db, member)
     await db.delete(member)
+    await bump_folder_versions(db, [folder_id])
     await db.commit()
+    invalidate_folder_access(db, folder_id, member_id)
+    await event_hub.publish(folder_id, "member.removed", current_user.id, user_id=str(member_id))
     return {"message": f"Member {member_id} deleted from folder {folder_id}"}
 
-@app.post("/folders/{folder_id}/tasks/search", response_model=List[TaskModel])
+@app.post("/folders/{folder_id}/tasks/search", response_model=List[TaskSearchResult], response_model_exclude_unset=True, dependencies=[Depends(rate_limit)])
 async def search_tasks_in_folder(
+    request: Request,
     folder_id: int,
     task: TaskModel, 
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(fastapi_users.current_user(active=True))
+    search: TaskSearchParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(current_active_user)
 ):
     await check_folder_access(folder_id, mode="member", db=db, current_user=current_user)
 
     stmt = select(Task).filter(Task.folder_id == folder_id)
     stmt = apply_task_filters(stmt, task)
 
-    result = await db.execute(stmt)
-    return result.scalars().all()
\ No newline at end of file
+    return await coalesced_task_search(request, stmt, task, search, db, current_user.id, folder_id)
\ No newline at end of file
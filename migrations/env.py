@@ -0,0 +1,59 @@
+from alembic import context
+from logging.config import fileConfig
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from models import Base
+import asyncio
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    from dependencies import DATABASE_URL
+
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection: Connection):
+    context.configure(connection=connection, target_metadata=target_metadata, compare_type=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_locked_migrations(connection: Connection):
+    from dependencies import migration_lock
+
+    with migration_lock(connection):
+        do_run_migrations(connection)
+
+async def run_async_migrations():
+    from dependencies import DATABASE_URL
+
+    engine = create_async_engine(DATABASE_URL, poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_locked_migrations)
+    await engine.dispose()
+
+def run_migrations_online():
+    # init_db hands over an open connection; the alembic CLI opens its own
+    connection = config.attributes.get("connection")
+    if connection is None:
+        asyncio.run(run_async_migrations())
+    else:
+        do_run_migrations(connection)
+
+
+if config.config_file_name is not None and "connection" not in config.attributes:
+    fileConfig(config.config_file_name)
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,79 @@
+"""baseline schema previously created by Base.metadata.create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+role_enum = sa.Enum("owner", "editor", "viewer", name="roleenum")
+completed_enum = sa.Enum("false", "in_progress", "true", name="completedenum")
+priority_enum = sa.Enum("low", "medium", "high", name="priorityenum")
+repeat_enum = sa.Enum("never", "daily", "weekly", "monthly", "yearly", name="repeatenum")
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_superuser", sa.Boolean()),
+        sa.Column("is_verified", sa.Boolean()),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "folders",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("owner_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("created_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "folder_members",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("folder_id", sa.Integer(), sa.ForeignKey("folders.id", ondelete="CASCADE")),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("role", role_enum),
+        sa.Column("added_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "tasks",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.String()),
+        sa.Column("completed", completed_enum),
+        sa.Column("due", sa.DateTime()),
+        sa.Column("priority", priority_enum),
+        sa.Column("repeat_type", repeat_enum),
+        sa.Column("repeat_amount", sa.Integer(), nullable=False),
+        sa.Column("created", sa.DateTime()),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("folder_id", sa.Integer(), sa.ForeignKey("folders.id", ondelete="CASCADE"), nullable=False),
+    )
+    op.create_index("ix_tasks_id", "tasks", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_tasks_id", table_name="tasks")
+    op.drop_table("tasks")
+    op.drop_table("folder_members")
+    op.drop_table("folders")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_table("users")
+
+    bind = op.get_bind()
+    for enum in (repeat_enum, priority_enum, completed_enum, role_enum):
+        enum.drop(bind, checkfirst=True)
@@ -0,0 +1,41 @@
+"""indexes for folder membership lookups and per-folder task listings
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+indexes = [
+    ("uq_folder_members_folder_id_user_id", "folder_members", ["folder_id", "user_id"], True),
+    ("ix_folder_members_user_id_folder_id", "folder_members", ["user_id", "folder_id"], False),
+    ("ix_tasks_folder_id_due_id", "tasks", ["folder_id", "due", "id"], False),
+    ("ix_tasks_folder_id_created_id", "tasks", ["folder_id", "created", "id"], False),
+]
+
+
+def upgrade():
+    # add_folder_member only guards against duplicates in application code,
+    # so drop any duplicate memberships before the unique index goes in
+    op.execute(sa.text("""
+        DELETE FROM folder_members
+        WHERE id NOT IN (SELECT min(id) FROM folder_members GROUP BY folder_id, user_id)
+    """))
+
+    # built concurrently so existing tables stay writable during the rollout
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in indexes:
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(indexes):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""full-text and trigram indexes for task search
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+    with op.get_context().autocommit_block():
+        op.execute(sa.text(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_search_document ON tasks "
+            "USING gin (to_tsvector('simple'::regconfig, (coalesce(title, '') || ' ') || coalesce(description, '')))"
+        ))
+        op.create_index(
+            "ix_tasks_title_trgm", "tasks", ["title"],
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_tasks_description_trgm", "tasks", ["description"],
+            postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in ("ix_tasks_description_trgm", "ix_tasks_title_trgm", "ix_tasks_search_document"):
+            op.drop_index(name, table_name="tasks", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,27 @@
+"""updated_at on tasks and folders, folder version counter
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # non-volatile defaults, so existing rows are filled without a table rewrite
+    op.add_column("tasks", sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()))
+    op.add_column("folders", sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()))
+    op.add_column("folders", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade():
+    op.drop_column("folders", "version")
+    op.drop_column("folders", "updated_at")
+    op.drop_column("tasks", "updated_at")
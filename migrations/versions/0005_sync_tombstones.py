@@ -0,0 +1,48 @@
+"""tombstones and change tracking for /sync
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("folder_members", sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()))
+
+    op.create_table(
+        "tombstones",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("kind", sa.Enum("task", "folder", "member", name="tombstonekindenum"), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("folder_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tombstones_folder_id_deleted_at", "tombstones", ["folder_id", "deleted_at"])
+    op.create_index("ix_tombstones_user_id_deleted_at", "tombstones", ["user_id", "deleted_at"])
+    op.create_index("ix_tombstones_deleted_at", "tombstones", ["deleted_at"])
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_tasks_folder_id_updated_at", "tasks", ["folder_id", "updated_at"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_tasks_folder_id_updated_at", table_name="tasks", postgresql_concurrently=True, if_exists=True)
+
+    op.drop_table("tombstones")
+    sa.Enum(name="tombstonekindenum").drop(op.get_bind(), checkfirst=True)
+    op.drop_column("folder_members", "updated_at")
@@ -0,0 +1,28 @@
+"""partial index for the recurrence scheduler
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_tasks_repeating_due", "tasks", ["due"],
+            postgresql_where=sa.text("repeat_type != 'never'"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_tasks_repeating_due", table_name="tasks", postgresql_concurrently=True, if_exists=True)
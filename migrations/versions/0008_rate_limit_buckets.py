@@ -0,0 +1,31 @@
+"""rate limit buckets table
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # unlogged: the buckets are rewritten on every limited request and are
+    # worthless after a crash
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+        prefixes=["UNLOGGED"],
+    )
+
+
+def downgrade():
+    op.drop_table("rate_limit_buckets")
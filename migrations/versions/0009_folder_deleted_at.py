@@ -0,0 +1,31 @@
+"""mark deleted folders until they are purged
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("folders", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+    # startup looks for marked folders whose purge was lost
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_folders_deleted", "folders", ["id"],
+            postgresql_where=sa.text("deleted_at IS NOT NULL"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_folders_deleted", table_name="folders", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("folders", "deleted_at")
@@ -1,12 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Boolean, Float, Index, JSON, func, text
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
-from schemas import PriorityEnum, CompletedEnum, RepeatEnum, RoleEnum
+from schemas import PriorityEnum, CompletedEnum, RepeatEnum, RoleEnum, TombstoneKindEnum, JobStatusEnum
 import uuid
 
 Base = declarative_base()
 
+SEARCH_CONFIG = "'simple'::regconfig"
+
 class User(Base):
     __tablename__ = "users"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -25,10 +27,22 @@ class Folder(Base):
     name = Column(String, nullable=False)
     owner_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # bumped with every task, member or folder change; drives collection ETags
+    version = Column(Integer, default=1, nullable=False)
+    # set by DELETE /folders/{id}; the folder is gone for every route from
+    # then on, and a background job purges its tasks and the row itself
+    deleted_at = Column(DateTime)
 
     owner = relationship("User")
-    tasks = relationship("Task", back_populates="folder", cascade="all, delete, delete-orphan")
-    members = relationship("FolderMember", back_populates="folder", cascade="all, delete, delete-orphan")
+    # children are removed by the database's ON DELETE CASCADE, never loaded
+    # just to be deleted
+    tasks = relationship("Task", back_populates="folder", cascade="all, delete, delete-orphan", passive_deletes=True)
+    members = relationship("FolderMember", back_populates="folder", cascade="all, delete, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index("ix_folders_deleted", "id", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
 
 class FolderMember(Base):
     __tablename__ = "folder_members"
@@ -37,10 +51,18 @@ class FolderMember(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     role = Column(Enum(RoleEnum), default=RoleEnum.viewer)
     added_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     folder = relationship("Folder", back_populates="members")
     user = relationship("User", back_populates="folder_memberships")
 
+    __table_args__ = (
+        # check_folder_access: one membership per (folder, user)
+        Index("uq_folder_members_folder_id_user_id", "folder_id", "user_id", unique=True),
+        # listings that start from the caller's memberships
+        Index("ix_folder_members_user_id_folder_id", "user_id", "folder_id"),
+    )
+
 class Task(Base):
     __tablename__ = "tasks"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -52,8 +74,79 @@ class Task(Base):
     repeat_type = Column(Enum(RepeatEnum), default=RepeatEnum.never)
     repeat_amount = Column(Integer, default=1, nullable=False)
     created = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     folder_id = Column(Integer, ForeignKey("folders.id", ondelete="CASCADE"), nullable=False)
 
     owner = relationship("User", back_populates="tasks")
     folder = relationship("Folder", back_populates="tasks")
+
+    __table_args__ = (
+        # per-folder listings, keyset-paginated on (due, id) or (created, id)
+        Index("ix_tasks_folder_id_due_id", "folder_id", "due", "id"),
+        Index("ix_tasks_folder_id_created_id", "folder_id", "created", "id"),
+        # /sync deltas within the folders that changed
+        Index("ix_tasks_folder_id_updated_at", "folder_id", "updated_at"),
+        # recurrence scheduler: overdue repeating tasks
+        Index("ix_tasks_repeating_due", "due", postgresql_where=text("repeat_type != 'never'")),
+        # substring filters in apply_task_filters (ILIKE '%...%')
+        Index("ix_tasks_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("ix_tasks_description_trgm", "description", postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"}),
+    )
+
+class Tombstone(Base):
+    # deletions reported by /sync. Rows without a user_id are visible to the
+    # folder's current members, rows with one only to that user (e.g. a
+    # folder they were removed from or that was deleted).
+    __tablename__ = "tombstones"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(Enum(TombstoneKindEnum), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    folder_id = Column(Integer, nullable=False)
+    user_id = Column(UUID(as_uuid=True))
+    deleted_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        Index("ix_tombstones_folder_id_deleted_at", "folder_id", "deleted_at"),
+        Index("ix_tombstones_user_id_deleted_at", "user_id", "deleted_at"),
+        Index("ix_tombstones_deleted_at", "deleted_at"),
+    )
+
+
+def task_search_document():
+    # constants are rendered inline so queries match the expression index
+    title, description = Task.__table__.c.title, Task.__table__.c.description
+    document = func.coalesce(title, text("''")).op("||")(text("' '")).op("||")(func.coalesce(description, text("''")))
+    return func.to_tsvector(text(SEARCH_CONFIG), document)
+
+Index("ix_tasks_search_document", task_search_document(), postgresql_using="gin")
+
+class Job(Base):
+    # background work claimed by workers with SKIP LOCKED; a running job whose
+    # heartbeat stops (the worker died) is claimed again
+    __tablename__ = "jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)
+    status = Column(Enum(JobStatusEnum), default=JobStatusEnum.pending, nullable=False)
+    payload = Column(JSON, nullable=False)
+    result = Column(JSON)
+    error = Column(String)
+    attempts = Column(Integer, default=0, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
+
+class RateLimitBucket(Base):
+    # token buckets shared by all workers (RATE_LIMIT_BACKEND=postgres),
+    # one row per user and route
+    __tablename__ = "rate_limit_buckets"
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
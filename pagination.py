@@ -0,0 +1,105 @@
+from fastapi import HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import and_, or_, Row, Select
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from models import Task
+from schemas import TaskModel, TaskSortEnum, ListFormatEnum
+import base64, binascii, json, orjson, os
+
+DEFAULT_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("TASKS_MAX_PAGE_SIZE", 1000))
+STREAM_BATCH_SIZE = int(os.getenv("TASKS_STREAM_BATCH_SIZE", 500))
+# listings are rendered straight from column rows; turn this on to check
+# every row against TaskModel first (useful in development, costs CPU)
+TASK_RESPONSE_VALIDATION = os.getenv("TASK_RESPONSE_VALIDATION", "false").lower() == "true"
+
+class TaskListParams:
+    def __init__(
+        self,
+        sort: TaskSortEnum = TaskSortEnum.due,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: ListFormatEnum = ListFormatEnum.json,
+    ):
+        self.sort = sort
+        self.cursor = cursor
+        self.limit = limit if limit or not cursor else DEFAULT_PAGE_SIZE
+        self.format = format
+
+task_columns = [getattr(Task, field) for field in TaskModel.model_fields]
+task_list_adapter = TypeAdapter(List[TaskModel])
+
+sort_columns = {
+    TaskSortEnum.due: Task.due,
+    TaskSortEnum.created: Task.created,
+}
+
+
+def encode_cursor(sort: TaskSortEnum, value: Optional[datetime], last_id: int) -> str:
+    payload = {"s": sort.value, "v": value.isoformat() if value else None, "i": last_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: TaskSortEnum) -> Tuple[Optional[datetime], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = datetime.fromisoformat(payload["v"]) if payload["v"] is not None else None
+        last_id = int(payload["i"])
+        cursor_sort = payload["s"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if cursor_sort != sort.value:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+
+    return value, last_id
+
+def apply_keyset(stmt: Select, sort: TaskSortEnum, cursor: Optional[str]) -> Select:
+    # rows are ordered (column ASC NULLS LAST, id ASC), so tasks without a
+    # due/created date form the tail of the listing
+    column = sort_columns[sort]
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if value is None:
+            stmt = stmt.where(column.is_(None), Task.id > last_id)
+        else:
+            stmt = stmt.where(or_(
+                column > value,
+                and_(column == value, Task.id > last_id),
+                column.is_(None),
+            ))
+
+    return stmt.order_by(column.asc().nulls_last(), Task.id.asc())
+
+def split_page(tasks: Sequence[Row], sort: TaskSortEnum, limit: Optional[int]) -> Tuple[Sequence[Row], Optional[str]]:
+    if not limit or len(tasks) <= limit:
+        return tasks, None
+
+    tasks = tasks[:limit]
+    last = tasks[-1]
+    return tasks, encode_cursor(sort, getattr(last, sort_columns[sort].key), last.id)
+
+class TaskListResponse(ORJSONResponse):
+    # same bytes as FastAPI's default rendering of List[TaskModel]: compact,
+    # raw UTF-8, enums by value, naive datetimes without an offset
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+def task_dicts(rows: Sequence[Row]) -> List[Dict]:
+    tasks = [row._asdict() for row in rows]
+    if TASK_RESPONSE_VALIDATION:
+        task_list_adapter.validate_python(tasks)
+    return tasks
+
+async def stream_ndjson(stmt: Select, bind: AsyncEngine) -> AsyncIterator[bytes]:
+    # the request's session is closed before a streaming body is sent, so the
+    # server-side cursor gets a session of its own on the same engine
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield b"".join(orjson.dumps(task, option=orjson.OPT_UTC_Z) + b"\n" for task in task_dicts(rows))
@@ -0,0 +1,152 @@
+from fastapi import HTTPException
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+from models import Folder, FolderMember
+from dependencies import engine
+from schemas import RoleEnum
+import os, time, uuid
+
+FOLDER_ACCESS_CACHE_SIZE = int(os.getenv("FOLDER_ACCESS_CACHE_SIZE", 10000))
+FOLDER_ACCESS_CACHE_TTL = float(os.getenv("FOLDER_ACCESS_CACHE_TTL", 10))
+
+editor_roles = {RoleEnum.owner, RoleEnum.editor}
+
+
+@dataclass(frozen=True)
+class FolderAccess:
+    id: int
+    name: str
+    owner_id: Optional[uuid.UUID]
+    created_at: Optional[datetime]
+    role: Optional[RoleEnum]
+
+
+class FolderAccessCache:
+    # bounded LRU of (user_id, folder_id) -> FolderAccess. Entries are only
+    # invalidated in the worker that made the change, so the TTL bounds how
+    # long other workers can serve a stale role.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[uuid.UUID, int], Tuple[float, FolderAccess]]" = OrderedDict()
+        self._by_folder: Dict[int, Set[uuid.UUID]] = {}
+
+    def get(self, user_id: uuid.UUID, folder_id: int) -> Optional[FolderAccess]:
+        key = (user_id, folder_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires, access = entry
+        if expires < time.monotonic():
+            self._discard(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return access
+
+    def set(self, user_id: uuid.UUID, access: FolderAccess):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+
+        key = (user_id, access.id)
+        self._entries[key] = (time.monotonic() + self.ttl, access)
+        self._entries.move_to_end(key)
+        self._by_folder.setdefault(access.id, set()).add(user_id)
+
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+
+    def invalidate(self, folder_id: int, user_id: Optional[uuid.UUID] = None):
+        if user_id is not None:
+            self._discard((user_id, folder_id))
+            return
+
+        for cached_user_id in list(self._by_folder.get(folder_id, ())):
+            self._discard((cached_user_id, folder_id))
+
+    def clear(self):
+        self._entries.clear()
+        self._by_folder.clear()
+
+    def _discard(self, key: Tuple[uuid.UUID, int]):
+        self._entries.pop(key, None)
+        user_id, folder_id = key
+        users = self._by_folder.get(folder_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self._by_folder[folder_id]
+
+
+folder_access_cache = FolderAccessCache(FOLDER_ACCESS_CACHE_SIZE, FOLDER_ACCESS_CACHE_TTL)
+
+def shares_access_cache(db: AsyncSession) -> bool:
+    # write routes trust the shared cache, so only rows read on the primary
+    # go into it; a lagging replica could put back a role just invalidated
+    return db.bind is engine
+
+
+async def resolve_folder_access_many(folder_ids: Iterable[int], db: AsyncSession, user_id: uuid.UUID) -> Dict[int, FolderAccess]:
+    # checks made within one request share the session, so db.info doubles as
+    # a request-scoped cache in front of the process-wide LRU
+    request_cache = db.info.setdefault("folder_access", {})
+    accesses = {}
+    missing = []
+
+    for folder_id in folder_ids:
+        key = (user_id, folder_id)
+        access = request_cache.get(key) or folder_access_cache.get(user_id, folder_id)
+        if access is None:
+            missing.append(folder_id)
+        else:
+            request_cache[key] = accesses[folder_id] = access
+
+    if missing:
+        stmt = (
+            select(Folder.id, Folder.name, Folder.owner_id, Folder.created_at, FolderMember.role)
+            .outerjoin(FolderMember, and_(FolderMember.folder_id == Folder.id, FolderMember.user_id == user_id))
+            .where(Folder.id.in_(missing), Folder.deleted_at.is_(None))
+        )
+        result = await db.execute(stmt)
+        for row in result:
+            access = FolderAccess(**row._mapping)
+            if shares_access_cache(db):
+                folder_access_cache.set(user_id, access)
+            request_cache[(user_id, access.id)] = accesses[access.id] = access
+
+    return accesses
+
+async def resolve_folder_access(folder_id: int, db: AsyncSession, user_id: uuid.UUID) -> Optional[FolderAccess]:
+    accesses = await resolve_folder_access_many([folder_id], db, user_id)
+    return accesses.get(folder_id)
+
+def require_access(access: Optional[FolderAccess], mode: str, user_id: uuid.UUID) -> FolderAccess:
+    if access is None:
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    if mode == "owner":
+        if access.owner_id != user_id:
+            raise HTTPException(status_code=403, detail="Only the folder owner can perform this action")
+    elif mode == "editor":
+        if access.role not in editor_roles:
+            raise HTTPException(status_code=403, detail="You must be an editor or owner to perform this action")
+    elif mode == "member":
+        if access.role is None:
+            raise HTTPException(status_code=403, detail="User is not a member of this folder")
+    else:
+        raise HTTPException(status_code=400, detail="Invalid mode. Mode must be either 'owner', 'editor', or 'member'")
+
+    return access
+
+def invalidate_folder_access(db: AsyncSession, folder_id: int, user_id: Optional[uuid.UUID] = None):
+    request_cache = db.info.get("folder_access", {})
+    for key in [key for key in request_cache if key[1] == folder_id and user_id in (None, key[0])]:
+        del request_cache[key]
+
+    folder_access_cache.invalidate(folder_id, user_id)
@@ -0,0 +1,112 @@
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Tuple
+from dependencies import async_session_maker, current_active_user
+from models import User, RateLimitBucket
+from metrics import registry
+import math, os, time, uuid
+
+# memory: every worker keeps its own buckets, so a client spread over N
+# workers gets up to N times the rate
+# postgres: buckets are rows in rate_limit_buckets, shared by all workers
+# (one extra statement per limited request)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# tokens added per second to each (user, route) bucket; 0 disables limiting
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", 5))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 20))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+rate_limited = registry.counter("rate_limited_total", "Requests rejected by the per-user rate limit", ["route"])
+
+
+def retry_after(tokens: float, rate: float) -> int:
+    return max(1, math.ceil((1 - tokens) / rate))
+
+
+class MemoryRateLimitStore:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def start(self):
+        pass
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, int]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+
+        # the least recently used bucket is dropped, which only refills it early
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+
+        return allowed, 0 if allowed else retry_after(tokens, rate)
+
+
+class PostgresRateLimitStore:
+    async def start(self):
+        # a bucket untouched for this long is full again
+        idle = RATE_LIMIT_BURST / RATE_LIMIT_PER_SECOND
+        async with async_session_maker() as session:
+            await session.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at < func.localtimestamp() - timedelta(seconds=idle)))
+            await session.commit()
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, int]:
+        # refill and take in one upsert on the database clock; a bucket
+        # without a whole token fails the WHERE and no row comes back
+        now = func.localtimestamp()
+        refilled = func.least(burst, RateLimitBucket.tokens + func.extract("epoch", now - RateLimitBucket.updated_at) * rate)
+        stmt = (
+            insert(RateLimitBucket)
+            .values(key=key, tokens=burst - 1, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[RateLimitBucket.key],
+                set_={"tokens": refilled - 1, "updated_at": now},
+                where=refilled >= 1,
+            )
+            .returning(RateLimitBucket.tokens)
+        )
+        async with async_session_maker() as session:
+            tokens = (await session.execute(stmt)).scalar_one_or_none()
+            await session.commit()
+
+        # the exact shortfall is not returned; one token's refill time is the
+        # longest the client can have to wait
+        return tokens is not None, 0 if tokens is not None else retry_after(0, rate)
+
+
+class RateLimiter:
+    def __init__(self):
+        self.store = MemoryRateLimitStore(RATE_LIMIT_MAX_KEYS)
+
+    async def start(self):
+        if RATE_LIMIT_PER_SECOND <= 0:
+            return
+        if RATE_LIMIT_BACKEND == "postgres":
+            self.store = PostgresRateLimitStore()
+        await self.store.start()
+
+    async def check(self, user_id: uuid.UUID, route: str) -> Optional[int]:
+        if RATE_LIMIT_PER_SECOND <= 0:
+            return None
+        allowed, wait = await self.store.take(f"{user_id}:{route}", RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+        return None if allowed else wait
+
+
+rate_limiter = RateLimiter()
+
+async def rate_limit(request: Request, current_user: User = Depends(current_active_user)):
+    # keyed by the route template, so every folder's search shares one bucket
+    route = request.scope["route"].path
+    wait = await rate_limiter.check(current_user.id, route)
+    if wait is not None:
+        rate_limited.inc(route=route)
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": str(wait)})
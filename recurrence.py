@@ -0,0 +1,181 @@
+from sqlalchemy import select
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+from dependencies import async_session_maker
+from models import Task
+from schemas import RepeatEnum, CompletedEnum
+from etags import bump_folder_versions
+from events import event_hub, task_payload
+from logs import get_logger
+import asyncio, heapq, os
+
+# seconds between scheduler runs; 0 leaves stale repeating tasks alone
+RECURRENCE_SCHEDULER_INTERVAL = float(os.getenv("RECURRENCE_SCHEDULER_INTERVAL", 0))
+RECURRENCE_BATCH_SIZE = int(os.getenv("RECURRENCE_BATCH_SIZE", 500))
+# how long a repeating task may stay overdue before the scheduler moves it on
+RECURRENCE_GRACE_HOURS = float(os.getenv("RECURRENCE_GRACE_HOURS", 24))
+
+logger = get_logger("recurrence")
+
+fixed_steps = {
+    RepeatEnum.daily: timedelta(days=1),
+    RepeatEnum.weekly: timedelta(weeks=1),
+}
+month_steps = {
+    RepeatEnum.monthly: 1,
+    RepeatEnum.yearly: 12,
+}
+
+
+def add_interval(due: datetime, repeat: str, amount: int, count: int = 1):
+    # counted from `due`, so within one expansion a task due on the 31st comes
+    # back on the 31st after a shorter month. Completions and the scheduler
+    # store the clamped date (Jan 31 -> Feb 28) and count on from it, so a
+    # persisted monthly task drifts to the shortest day it has passed.
+    repeat = RepeatEnum(repeat)
+    if repeat in fixed_steps:
+        return due + fixed_steps[repeat] * (amount * count)
+    elif repeat in month_steps:
+        return due + relativedelta(months=month_steps[repeat] * amount * count)
+
+def repeats(repeat: Optional[str], amount: Optional[int]) -> bool:
+    # rows written before repeat_amount was validated may hold 0 or less;
+    # they are treated as not repeating rather than stepped by nothing
+    return repeat is not None and RepeatEnum(repeat) != RepeatEnum.never and amount is not None and amount >= 1
+
+def intervals_after(due: datetime, repeat: str, amount: int, after: datetime) -> int:
+    # smallest count >= 0 with add_interval(due, ..., count) > after
+    if due > after or not repeats(repeat, amount):
+        return 0
+
+    repeat = RepeatEnum(repeat)
+    if repeat in fixed_steps:
+        step = fixed_steps[repeat] * amount
+        return (after - due) // step + 1
+
+    months = month_steps[repeat] * amount
+    elapsed = (after.year - due.year) * 12 + after.month - due.month
+    count = max(elapsed // months, 0)
+    # month lengths can put the estimate one step off either way
+    while count > 0 and add_interval(due, repeat, amount, count) > after:
+        count -= 1
+    while add_interval(due, repeat, amount, count) <= after:
+        count += 1
+    return count
+
+def next_occurrence(due: datetime, repeat: str, amount: int, after: Optional[datetime] = None) -> datetime:
+    # completing a repeating task moves it at least one interval, and past
+    # every occurrence that is already over
+    if not repeats(repeat, amount):
+        return due
+    after = max(after or datetime.now(), due)
+    return add_interval(due, repeat, amount, intervals_after(due, repeat, amount, after))
+
+def occurrences(due: datetime, repeat: str, amount: int, start: datetime, end: datetime) -> Iterator[datetime]:
+    # occurrences in [start, end), the first one being the due date itself
+    if not repeats(repeat, amount):
+        if start <= due < end:
+            yield due
+        return
+
+    count = intervals_after(due, repeat, amount, start - timedelta(microseconds=1))
+    occurrence = add_interval(due, repeat, amount, count)
+    while occurrence < end:
+        yield occurrence
+        count += 1
+        occurrence = add_interval(due, repeat, amount, count)
+
+def next_occurrences(due: datetime, repeat: str, amount: int, n: int, after: Optional[datetime] = None) -> List[datetime]:
+    start = after or datetime.now()
+    upcoming = occurrences(due, repeat, amount, start, datetime.max)
+    return [occurrence for _, occurrence in zip(range(n), upcoming)]
+
+def expand_occurrences(tasks: Iterable, start: datetime, end: datetime) -> Iterator[Tuple[datetime, object]]:
+    # merges every task's occurrences lazily in (occurrence, task id) order,
+    # so taking the first N costs O(N log tasks) however long the range is
+    def stream(task):
+        for occurrence in occurrences(task.due, task.repeat_type, task.repeat_amount, start, end):
+            yield occurrence, task.id, task
+
+    streams = [stream(task) for task in tasks if task.due is not None]
+    for occurrence, _, task in heapq.merge(*streams, key=lambda item: item[:2]):
+        yield occurrence, task
+
+
+class RecurrenceScheduler:
+    def __init__(self, interval: float, batch_size: int, grace: timedelta):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace = grace
+        self._task: Optional[asyncio.Task] = None
+        # tasks whose next occurrence could not be computed are left alone
+        # for the life of the worker instead of blocking every batch
+        self._failed: Set[int] = set()
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                while await self.advance_stale() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Advancing repeating tasks failed", extra={"event": "recurrence.failed"})
+            await asyncio.sleep(self.interval)
+
+    async def advance_stale(self, now: Optional[datetime] = None) -> int:
+        # SKIP LOCKED lets every worker run the scheduler without two of them
+        # advancing the same task or waiting on each other's batches
+        now = now or datetime.now()
+        stmt = (
+            select(Task)
+            .where(Task.repeat_type != RepeatEnum.never, Task.repeat_amount >= 1, Task.due < now - self.grace)
+            .order_by(Task.due)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if self._failed:
+            stmt = stmt.where(Task.id.not_in(self._failed))
+
+        async with async_session_maker() as session:
+            tasks = (await session.execute(stmt)).scalars().all()
+            if not tasks:
+                return 0
+
+            advanced = []
+            for task in tasks:
+                try:
+                    due = next_occurrence(task.due, task.repeat_type, task.repeat_amount, now)
+                except (ValueError, OverflowError):
+                    logger.exception("Skipping repeating task", extra={"event": "recurrence.skipped", "task_id": task.id})
+                    self._failed.add(task.id)
+                    continue
+                task.due = due
+                task.completed = CompletedEnum.false
+                advanced.append(task)
+
+            await bump_folder_versions(session, {task.folder_id for task in advanced})
+            await session.commit()
+
+            for task in advanced:
+                await event_hub.publish(task.folder_id, "task.updated", None, task=task_payload(task))
+
+        return len(tasks)
+
+
+recurrence_scheduler = RecurrenceScheduler(
+    RECURRENCE_SCHEDULER_INTERVAL,
+    RECURRENCE_BATCH_SIZE,
+    timedelta(hours=RECURRENCE_GRACE_HOURS),
+)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 from enum import Enum
 from fastapi_users import schemas
 import uuid
@@ -27,6 +27,29 @@ class RepeatEnum(str, Enum):
     monthly = "monthly"
     yearly = "yearly"
 
+class TombstoneKindEnum(str, Enum):
+    task = "task"
+    folder = "folder"
+    member = "member"
+
+class JobStatusEnum(str, Enum):
+    pending = "pending"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class TaskSortEnum(str, Enum):
+    due = "due"
+    created = "created"
+
+class ListFormatEnum(str, Enum):
+    json = "json"
+    ndjson = "ndjson"
+
+class ExportFormatEnum(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
 class TaskModel(BaseModel):
     id: Optional[int] = None
     title: Optional[str] = None
@@ -40,16 +63,61 @@ class TaskModel(BaseModel):
     user_id: Optional[uuid.UUID] = None
     folder_id: Optional[int] = None
 
+class TaskSearchResult(TaskModel):
+    rank: Optional[float] = None
+    title_highlight: Optional[str] = None
+    description_highlight: Optional[str] = None
+
+class AgendaItem(TaskModel):
+    occurrence: datetime
+
 class TaskResponse(BaseModel):
     message: str
     task: TaskModel
 
+class BatchOperationEnum(str, Enum):
+    create = "create"
+    update = "update"
+    complete = "complete"
+    delete = "delete"
+
+class TaskBatchOperation(BaseModel):
+    op: BatchOperationEnum
+    id: Optional[int] = None
+    task: Optional[TaskModel] = None
+
+class TaskBatchResult(BaseModel):
+    index: int
+    op: BatchOperationEnum
+    status_code: int
+    detail: Optional[str] = None
+    task: Optional[TaskModel] = None
+
+class TaskBatchResponse(BaseModel):
+    message: str
+    results: List[TaskBatchResult]
+
 class FolderModel(BaseModel):
     id: Optional[int] = None
     name: str
     created_at: Optional[datetime] = None
     owner_id: Optional[uuid.UUID] = None
 
+class FolderListItem(FolderModel):
+    role: Optional[RoleEnum] = None
+    member_count: int = 0
+    task_count: int = 0
+
+class FolderSummary(BaseModel):
+    folder_id: int
+    name: str
+    total: int
+    by_status: Dict[CompletedEnum, int]
+    by_priority: Dict[PriorityEnum, int]
+    no_priority: int
+    overdue: int
+    due_today: int
+
 class FolderMemberModel(BaseModel):
     id: Optional[int] = None
     folder_id: Optional[int] = None
@@ -63,6 +131,42 @@ class FolderMemberWithEmail(FolderMemberModel):
     class Config:
         from_attributes = True
 
+class TombstoneModel(BaseModel):
+    kind: TombstoneKindEnum
+    id: int
+    folder_id: int
+    deleted_at: datetime
+
+class SyncResponse(BaseModel):
+    token: str
+    tasks: List[TaskModel]
+    folders: List[FolderModel]
+    members: List[FolderMemberModel]
+    deleted: List[TombstoneModel]
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: str
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+class JobModel(BaseModel):
+    id: uuid.UUID
+    kind: str
+    status: JobStatusEnum
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class UserReturnModel(BaseModel):
     id: Optional[uuid.UUID] = None
     email: Optional[str] = None
@@ -0,0 +1,66 @@
+from fastapi import Query, Response
+from pydantic import TypeAdapter
+from sqlalchemy import func, text, Select
+from sqlalchemy.engine import Result
+from typing import List, Optional
+from models import Task, SEARCH_CONFIG, task_search_document
+from schemas import TaskModel, TaskSearchResult
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+import re
+
+TITLE_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"
+DESCRIPTION_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MinWords=5, MaxWords=20"
+
+search_result_adapter = TypeAdapter(List[TaskSearchResult])
+
+
+class TaskSearchParams:
+    def __init__(
+        self,
+        q: Optional[str] = None,
+        highlight: bool = False,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.query = to_prefix_tsquery(q) if q else None
+        self.highlight = highlight
+        self.limit = limit
+
+
+def to_prefix_tsquery(q: str) -> Optional[str]:
+    # every word must match, the last letters of each word may be missing
+    terms = re.findall(r"[^\W_]+", q)
+    if not terms:
+        return None
+
+    return " & ".join(f"{term}:*" for term in terms)
+
+def apply_text_search(stmt: Select, params: TaskSearchParams) -> Select:
+    document = task_search_document()
+    tsquery = func.to_tsquery(text(SEARCH_CONFIG), params.query)
+    rank = func.ts_rank_cd(document, tsquery).label("rank")
+
+    stmt = stmt.where(document.op("@@")(tsquery)).add_columns(rank)
+
+    if params.highlight:
+        # headlines are only computed for the rows that survive the limit
+        stmt = stmt.add_columns(
+            func.ts_headline(text(SEARCH_CONFIG), Task.title, tsquery, TITLE_HEADLINE_OPTIONS).label("title_highlight"),
+            func.ts_headline(text(SEARCH_CONFIG), Task.description, tsquery, DESCRIPTION_HEADLINE_OPTIONS).label("description_highlight"),
+        )
+
+    return stmt.order_by(rank.desc(), Task.id).limit(params.limit or DEFAULT_PAGE_SIZE)
+
+def search_results(result: Result) -> List[dict]:
+    results = []
+    for row in result:
+        extra = dict(row._mapping)
+        task = extra.pop(Task.__name__)
+        results.append({**TaskModel.model_validate(task, from_attributes=True).model_dump(), **extra})
+
+    return results
+
+def render_search_results(results: list) -> Response:
+    # the validation and exclude_unset dump the routes' response_model
+    # applies, done once so coalesced requests can share the body
+    validated = search_result_adapter.validate_python(results, from_attributes=True)
+    return Response(search_result_adapter.dump_json(validated, exclude_unset=True), media_type="application/json")
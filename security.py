@@ -0,0 +1,125 @@
+from fastapi import HTTPException, Request
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from metrics import registry
+import argon2, asyncio, os
+
+# new hashes use this algorithm and cost; hashes made with another algorithm
+# or cost still verify and are replaced on the user's next login
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "argon2")
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", argon2.DEFAULT_TIME_COST))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", argon2.DEFAULT_MEMORY_COST))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", argon2.DEFAULT_PARALLELISM))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# argon2-cffi and bcrypt release the GIL, so threads already hash in
+# parallel; processes isolate the work further at the cost of pickling
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+LOGIN_MAX_CONCURRENT_PER_IP = int(os.getenv("LOGIN_MAX_CONCURRENT_PER_IP", 4))
+LOGIN_MAX_CONCURRENT_PER_ACCOUNT = int(os.getenv("LOGIN_MAX_CONCURRENT_PER_ACCOUNT", 2))
+
+login_throttled = registry.counter("login_throttled_total", "Login attempts rejected by the concurrency limiter", ["scope"])
+
+
+def build_password_hash() -> PasswordHash:
+    argon2_hasher = Argon2Hasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+    bcrypt_hasher = BcryptHasher(rounds=BCRYPT_ROUNDS)
+
+    if PASSWORD_HASH_ALGORITHM == "bcrypt":
+        return PasswordHash((bcrypt_hasher, argon2_hasher))
+    if PASSWORD_HASH_ALGORITHM == "argon2":
+        return PasswordHash((argon2_hasher, bcrypt_hasher))
+    raise ValueError(f"Unsupported PASSWORD_HASH_ALGORITHM: {PASSWORD_HASH_ALGORITHM}")
+
+password_hash = build_password_hash()
+# for the rare fastapi-users code paths that still hash synchronously
+password_helper = PasswordHelper(password_hash)
+
+
+# module-level so a process pool can pickle them; each worker process
+# builds its own password_hash from the same environment
+def _hash(password: str) -> str:
+    return password_hash.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return password_hash.verify_and_update(password, hashed_password)
+
+
+_executor: Optional[Executor] = None
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+def shutdown_password_hashing():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), _hash, password)
+
+async def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), _verify_and_update, password, hashed_password)
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active: Dict[str, int] = {}
+
+    def acquire(self, key: str) -> bool:
+        if self.limit > 0 and self._active.get(key, 0) >= self.limit:
+            return False
+        self._active[key] = self._active.get(key, 0) + 1
+        return True
+
+    def release(self, key: str):
+        count = self._active.get(key, 0) - 1
+        if count > 0:
+            self._active[key] = count
+        else:
+            self._active.pop(key, None)
+
+
+ip_limiter = ConcurrencyLimiter(LOGIN_MAX_CONCURRENT_PER_IP)
+account_limiter = ConcurrencyLimiter(LOGIN_MAX_CONCURRENT_PER_ACCOUNT)
+
+def too_many_logins(scope: str) -> HTTPException:
+    login_throttled.inc(scope=scope)
+    return HTTPException(status_code=429, detail="Too many concurrent login attempts", headers={"Retry-After": "1"})
+
+async def limit_login_concurrency(request: Request):
+    # caps hashing work in flight per client and per account on this worker,
+    # so one client cannot queue up the whole hashing pool
+    if request.method != "POST" or not request.url.path.endswith("/login"):
+        yield
+        return
+
+    ip = request.client.host if request.client else "unknown"
+    form = await request.form()
+    account = str(form.get("username", "")).lower()
+
+    if not ip_limiter.acquire(ip):
+        raise too_many_logins("ip")
+    if not account_limiter.acquire(account):
+        ip_limiter.release(ip)
+        raise too_many_logins("account")
+
+    try:
+        yield
+    finally:
+        account_limiter.release(account)
+        ip_limiter.release(ip)
@@ -0,0 +1,52 @@
+"""Run the API in production.
+
+    python serve.py
+
+Applies the migrations once, then starts WEB_CONCURRENCY uvicorn worker
+processes on PORT. The workers skip the migrations themselves; each one
+warms its connection pools before taking requests. On SIGTERM uvicorn stops
+accepting connections and gives in-flight requests up to
+GRACEFUL_SHUTDOWN_SECONDS to finish before the workers shut down.
+"""
+from dotenv import load_dotenv
+import asyncio, os
+import uvicorn
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8080))
+# every worker has its own connection pools, so raise this together with
+# the database's max_connections (see the README)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+# kept under the platform's SIGTERM-to-SIGKILL window (10s on Cloud Run), so
+# the lifespan shutdown still gets to stop the jobs and close the pools
+GRACEFUL_SHUTDOWN_SECONDS = float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", 8))
+
+
+async def migrate():
+    from dependencies import dispose_engines
+    from main import init_db
+    try:
+        await init_db()
+    finally:
+        # the workers are forked without this process's connections
+        await dispose_engines()
+
+def main():
+    skip_schema_init = os.getenv("SKIP_SCHEMA_INIT", "false").lower() == "true"
+    # set before main is first imported, and inherited by the workers
+    os.environ["SKIP_SCHEMA_INIT"] = "true"
+    if not skip_schema_init:
+        asyncio.run(migrate())
+
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import List
+from models import Task, Folder, FolderMember
+from schemas import CompletedEnum, PriorityEnum, FolderSummary
+import uuid
+
+
+def count_where(condition):
+    return func.count(Task.id).filter(condition)
+
+async def build_folder_summaries(db: AsyncSession, user_id: uuid.UUID, now: datetime) -> List[FolderSummary]:
+    start_of_day = datetime.combine(now.date(), datetime.min.time())
+    open_task = Task.completed.is_distinct_from(CompletedEnum.true)
+
+    # one grouped pass over the caller's folders; the outer join keeps
+    # empty folders, and each count is a FILTER over the same rows
+    stmt = (
+        select(
+            Folder.id,
+            Folder.name,
+            func.count(Task.id).label("total"),
+            *(count_where(Task.completed == status).label(f"completed_{status.name}") for status in CompletedEnum),
+            *(count_where(Task.priority == priority).label(f"priority_{priority.name}") for priority in PriorityEnum),
+            count_where(Task.priority.is_(None)).label("priority_none"),
+            count_where(and_(open_task, Task.due < now)).label("overdue"),
+            count_where(and_(open_task, Task.due >= start_of_day, Task.due < start_of_day + timedelta(days=1))).label("due_today"),
+        )
+        .join(FolderMember, and_(FolderMember.folder_id == Folder.id, FolderMember.user_id == user_id))
+        .outerjoin(Task, Task.folder_id == Folder.id)
+        .group_by(Folder.id, Folder.name)
+        .order_by(Folder.id)
+    )
+    result = await db.execute(stmt)
+
+    return [
+        FolderSummary(
+            folder_id=row.id,
+            name=row.name,
+            total=row.total,
+            by_status={status: row._mapping[f"completed_{status.name}"] for status in CompletedEnum},
+            by_priority={priority: row._mapping[f"priority_{priority.name}"] for priority in PriorityEnum},
+            no_priority=row.priority_none,
+            overdue=row.overdue,
+            due_today=row.due_today,
+        )
+        for row in result
+    ]
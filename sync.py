@@ -0,0 +1,133 @@
+from fastapi import HTTPException
+from sqlalchemy import select, insert, delete, literal, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+from models import Task, Folder, FolderMember, Tombstone
+from schemas import TombstoneKindEnum
+import base64, binascii, json, os, uuid
+
+# rows are stamped with the writer's clock when the statement runs but only
+# become visible at commit, so each delta re-reads a short window before the
+# token; clients apply rows by id, which makes the repeats harmless
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", 5))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+
+
+def encode_sync_token(at: datetime) -> str:
+    raw = json.dumps({"t": at.isoformat()}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> datetime:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        since = datetime.fromisoformat(json.loads(raw)["t"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+    # tombstones older than the retention window are gone, so a delta from
+    # before it could miss deletions
+    if since < datetime.now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise HTTPException(status_code=410, detail="Sync token expired, a full sync is required")
+
+    return since
+
+
+async def record_task_deletions(db: AsyncSession, tasks: Iterable[Tuple[int, int]]):
+    rows = [
+        {"kind": TombstoneKindEnum.task, "entity_id": task_id, "folder_id": folder_id, "deleted_at": datetime.now()}
+        for task_id, folder_id in tasks
+    ]
+    if rows:
+        await db.execute(insert(Tombstone), rows)
+
+async def record_folder_deletion(db: AsyncSession, folder_id: int):
+    # one tombstone per member, since nobody is a member of the folder anymore
+    # once it is gone; its tasks and memberships go with it on the client
+    members = select(
+        literal(TombstoneKindEnum.folder, Tombstone.kind.type),
+        FolderMember.folder_id,
+        FolderMember.folder_id,
+        FolderMember.user_id,
+        literal(datetime.now(), Tombstone.deleted_at.type),
+    ).where(FolderMember.folder_id == folder_id)
+
+    stmt = insert(Tombstone).from_select(["kind", "entity_id", "folder_id", "user_id", "deleted_at"], members)
+    await db.execute(stmt)
+
+async def record_member_removal(db: AsyncSession, member: FolderMember):
+    now = datetime.now()
+    await db.execute(insert(Tombstone), [
+        # the remaining members drop the membership row
+        {"kind": TombstoneKindEnum.member, "entity_id": member.id, "folder_id": member.folder_id, "deleted_at": now},
+        # the removed user drops the whole folder
+        {"kind": TombstoneKindEnum.folder, "entity_id": member.folder_id, "folder_id": member.folder_id, "user_id": member.user_id, "deleted_at": now},
+    ])
+
+async def prune_tombstones(db: AsyncSession):
+    cutoff = datetime.now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    await db.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff))
+    await db.commit()
+
+
+async def build_sync(db: AsyncSession, user_id: uuid.UUID, since: Optional[datetime]) -> dict:
+    token = encode_sync_token(datetime.now())
+    my_folders = select(FolderMember.folder_id).where(FolderMember.user_id == user_id)
+
+    if since is None:
+        folders = (await db.execute(select(Folder).where(Folder.id.in_(my_folders)).order_by(Folder.id))).scalars().all()
+        tasks = (await db.execute(select(Task).where(Task.folder_id.in_(my_folders)).order_by(Task.id))).scalars().all()
+        members = (await db.execute(select(FolderMember).where(FolderMember.folder_id.in_(my_folders)).order_by(FolderMember.id))).scalars().all()
+        return {"token": token, "tasks": tasks, "folders": folders, "members": members, "deleted": []}
+
+    after = since - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    result = await db.execute(select(FolderMember.folder_id, FolderMember.added_at).where(FolderMember.user_id == user_id))
+    # folders joined since the token are sent in full
+    joined = [folder_id for folder_id, added_at in result if added_at and added_at > after]
+
+    # every task and member change bumps its folder's updated_at, so only
+    # folders that changed need to be searched for rows
+    stmt = (
+        select(Folder)
+        .where(Folder.id.in_(my_folders), or_(Folder.updated_at > after, Folder.id.in_(joined)))
+        .order_by(Folder.id)
+    )
+    folders = (await db.execute(stmt)).scalars().all()
+    changed = [folder.id for folder in folders]
+
+    tasks, members = [], []
+    if changed:
+        stmt = (
+            select(Task)
+            .where(Task.folder_id.in_(changed), or_(Task.updated_at > after, Task.folder_id.in_(joined)))
+            .order_by(Task.id)
+        )
+        tasks = (await db.execute(stmt)).scalars().all()
+
+        stmt = (
+            select(FolderMember)
+            .where(FolderMember.folder_id.in_(changed), or_(FolderMember.updated_at > after, FolderMember.folder_id.in_(joined)))
+            .order_by(FolderMember.id)
+        )
+        members = (await db.execute(stmt)).scalars().all()
+
+    stmt = (
+        select(Tombstone)
+        .where(
+            Tombstone.deleted_at > after,
+            or_(
+                and_(Tombstone.user_id.is_(None), Tombstone.folder_id.in_(my_folders)),
+                # skip removals from folders the user has since rejoined
+                and_(Tombstone.user_id == user_id, Tombstone.folder_id.not_in(my_folders)),
+            )
+        )
+        .order_by(Tombstone.id)
+    )
+    tombstones = (await db.execute(stmt)).scalars().all()
+    deleted = [
+        {"kind": tombstone.kind, "id": tombstone.entity_id, "folder_id": tombstone.folder_id, "deleted_at": tombstone.deleted_at}
+        for tombstone in tombstones
+    ]
+
+    return {"token": token, "tasks": tasks, "folders": folders, "members": members, "deleted": deleted}
@@ -0,0 +1,175 @@
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import insert, Select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+from models import Task
+from schemas import TaskModel, ExportFormatEnum
+from pagination import STREAM_BATCH_SIZE
+import asyncpg, codecs, csv, io, orjson, os
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 100000))
+# row errors listed in the response; later failures are only counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", 100))
+
+export_fields = list(TaskModel.model_fields)
+# the target folder and the importing user replace these
+import_ignored_fields = {"id", "user_id", "folder_id"}
+INT4_MIN, INT4_MAX = -2**31, 2**31 - 1
+
+copy_columns = ["title", "description", "completed", "due", "priority", "repeat_type", "repeat_amount", "user_id", "folder_id", "created", "updated_at"]
+
+export_media_types = {
+    ExportFormatEnum.csv: "text/csv",
+    ExportFormatEnum.ndjson: "application/x-ndjson",
+}
+
+
+# export
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def stream_csv(stmt: Select, bind: AsyncEngine) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_fields)
+    yield buffer.getvalue()
+
+    async with AsyncSession(bind) as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+
+
+# import
+
+async def read_lines(request: Request) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in request.stream():
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The upload must be UTF-8 encoded")
+
+    if pending:
+        yield pending.rstrip("\r")
+
+async def read_csv(request: Request) -> AsyncIterator[Union[dict, str]]:
+    header = None
+    record = None
+    async for line in read_lines(request):
+        # a quoted field may span lines; the record is complete once its
+        # quotes are balanced
+        record = line if record is None else f"{record}\n{line}"
+        if record.count('"') % 2:
+            continue
+
+        text, record = record, None
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            if "title" not in header:
+                raise HTTPException(status_code=400, detail="The CSV header must include a title column")
+            continue
+        if len(values) != len(header):
+            yield f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield {field: value for field, value in zip(header, values) if value != ""}
+
+    if record is not None:
+        yield "Unterminated quoted field"
+
+async def read_ndjson(request: Request) -> AsyncIterator[Union[dict, str]]:
+    async for line in read_lines(request):
+        if not line.strip():
+            continue
+        try:
+            data = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield f"Invalid JSON: {e}"
+            continue
+        yield data if isinstance(data, dict) else "Each line must be a JSON object"
+
+async def read_import(request: Request, format: ExportFormatEnum) -> AsyncIterator[Tuple[int, Union[TaskModel, str]]]:
+    # rows are parsed as the upload arrives and validated one at a time;
+    # a row that fails comes back as its error message
+    rows = read_csv(request) if format == ExportFormatEnum.csv else read_ndjson(request)
+    number = 0
+    async for data in rows:
+        number += 1
+        if number > IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"An import may contain at most {IMPORT_MAX_ROWS} rows")
+        if isinstance(data, str):
+            yield number, data
+            continue
+        try:
+            task = TaskModel.model_validate({field: value for field, value in data.items() if field not in import_ignored_fields})
+        except ValidationError as e:
+            task = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        yield number, task
+
+def storage_error(values: Dict) -> Optional[str]:
+    # values TaskModel accepts but the tasks table does not; caught here so
+    # the row is reported instead of failing its whole batch
+    for column in ("title", "description"):
+        if values[column] is not None and "\x00" in values[column]:
+            return f"{column}: NUL characters are not allowed"
+    for column in ("due", "created"):
+        if values[column] is not None and values[column].tzinfo is not None:
+            return f"{column}: timezone offsets are not supported"
+    if not INT4_MIN <= values["repeat_amount"] <= INT4_MAX:
+        return "repeat_amount: out of range"
+    return None
+
+def copy_record(values: Dict) -> tuple:
+    # COPY bypasses SQLAlchemy's Enum type, and the Postgres enums are
+    # declared with the member names
+    return tuple(values[column].name if isinstance(values[column], Enum) else values[column] for column in copy_columns)
+
+async def copy_tasks(db: AsyncSession, rows: List[Dict]):
+    conn = await db.connection()
+    if conn.dialect.name != "postgresql":
+        await conn.execute(insert(Task), rows)
+        return
+
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table("tasks", records=[copy_record(row) for row in rows], columns=copy_columns)
+
+async def store_tasks(db: AsyncSession, rows: List[Tuple[int, Dict]]):
+    # each batch runs in a savepoint; if the database still rejects it, the
+    # rows are retried one at a time to find the one it rejects
+    try:
+        async with db.begin_nested():
+            await copy_tasks(db, [values for _, values in rows])
+        return
+    except (DBAPIError, asyncpg.PostgresError):
+        pass
+
+    for number, values in rows:
+        try:
+            async with db.begin_nested():
+                await copy_tasks(db, [values])
+        except (DBAPIError, asyncpg.PostgresError) as e:
+            raise HTTPException(status_code=400, detail=f"Row {number} could not be stored: {getattr(e, 'orig', e)}")